@@ -0,0 +1,316 @@
+"""Two-tier cache: a bounded in-process LRU (L1) in front of a shared cache (L2).
+
+CACHES["default"] is a TieredCache whose LOCATION names the shared alias
+(Redis, or a file cache when no REDIS_URL is set). Reads are answered from
+L1 when possible, so a hot key costs no round trip; L1 holds an entry for
+at most L1_TIMEOUT seconds, which bounds how long a write made by another
+worker can go unseen. Writes and deletes go to both tiers.
+
+Keys are "<namespace>:<rest>". The namespace labels the hit/miss counters
+(see metrics()), and versioned_key() embeds a per-namespace version so
+bump_namespace() retires every key of a namespace at once.
+
+get_or_set() is stampede-protected: on a miss one thread per process, and
+one process per key (via a lock in L2), computes the value while the others
+wait for it instead of all recomputing at once.
+"""
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+STATS_PREFIX = "cache-stats"
+
+
+def namespace_of(key):
+  key = str(key)
+  if ":" in key:
+    return key.split(":", 1)[0]
+  # {% cache %} keys: "template.cache.<fragment name>.<hash>"
+  return key.rsplit(".", 1)[0]
+
+
+class LRU:
+  """Thread-safe LRU of pickled values with a per-entry expiry."""
+
+  def __init__(self, max_entries):
+    self.max_entries = max_entries
+    self._data = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._data.get(key)
+      if entry is None:
+        return _MISSING
+      expires, pickled = entry
+      if expires <= time.monotonic():
+        del self._data[key]
+        return _MISSING
+      self._data.move_to_end(key)
+    return pickle.loads(pickled)
+
+  def set(self, key, value, ttl):
+    # Pickled like LocMemCache, so callers never share a mutable value.
+    pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    with self._lock:
+      self._data[key] = (time.monotonic() + ttl, pickled)
+      self._data.move_to_end(key)
+      while len(self._data) > self.max_entries:
+        self._data.popitem(last=False)
+
+  def delete(self, key):
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+
+  def __len__(self):
+    return len(self._data)
+
+
+class _ProcessState:
+  # Django hands each thread its own backend instance; L1, the counters and
+  # the in-flight computations are shared by every thread of the process.
+  def __init__(self, max_entries):
+    self.l1 = LRU(max_entries)
+    self.lock = threading.Lock()
+    self.counts = Counter()
+    self.pending = 0
+    self.flights = {}
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+  def __init__(self, location, params):
+    super().__init__(params)
+    options = params.get("OPTIONS", {})
+    self.l2_alias = location
+    self.l1_timeout = options.get("L1_TIMEOUT", 5)
+    self.lock_timeout = options.get("LOCK_TIMEOUT", 10)
+    self.metrics_flush_every = options.get("METRICS_FLUSH_EVERY", 100)
+    with _states_lock:
+      self._state = _states.setdefault(location, _ProcessState(options.get("L1_MAX_ENTRIES", 1000)))
+
+  @property
+  def l2(self):
+    return caches[self.l2_alias]
+
+  # L1 -----------------------------------------------------------------
+
+  def _l1_key(self, key, version):
+    return self.make_and_validate_key(key, version=version)
+
+  def _l1_ttl(self, timeout):
+    if timeout is DEFAULT_TIMEOUT or timeout is None:
+      return self.l1_timeout
+    return min(timeout, self.l1_timeout)
+
+  def _l1_set(self, key, value, timeout, version):
+    ttl = self._l1_ttl(timeout)
+    if ttl > 0:
+      self._state.l1.set(self._l1_key(key, version), value, ttl)
+    else:
+      self._state.l1.delete(self._l1_key(key, version))
+
+  # Metrics --------------------------------------------------------------
+
+  def _record(self, key, tier, hit):
+    state = self._state
+    with state.lock:
+      state.counts[(namespace_of(key), tier, "hit" if hit else "miss")] += 1
+      state.pending += 1
+      due = state.pending >= self.metrics_flush_every
+    if due:
+      self.flush_metrics()
+
+  def flush_metrics(self):
+    """Add this process's counters to the totals kept in L2."""
+    state = self._state
+    with state.lock:
+      counts, state.counts, state.pending = state.counts, Counter(), 0
+    if not counts:
+      return
+    l2 = self.l2
+    namespaces = set(l2.get(f"{STATS_PREFIX}:namespaces") or ())
+    for (namespace, tier, outcome), count in counts.items():
+      key = f"{STATS_PREFIX}:{namespace}:{tier}:{outcome}"
+      l2.add(key, 0, None)
+      l2.incr(key, count)
+      namespaces.add(namespace)
+    l2.set(f"{STATS_PREFIX}:namespaces", sorted(namespaces), None)
+
+  def metrics(self):
+    """{namespace: {"l1_hit": n, "l1_miss": n, "l2_hit": n, "l2_miss": n}} across all processes."""
+    self.flush_metrics()
+    l2 = self.l2
+    result = {}
+    for namespace in l2.get(f"{STATS_PREFIX}:namespaces") or ():
+      keys = {f"{STATS_PREFIX}:{namespace}:{tier}:{outcome}": f"{tier}_{outcome}"
+              for tier in ("l1", "l2") for outcome in ("hit", "miss")}
+      found = l2.get_many(list(keys))
+      result[namespace] = {label: found.get(key, 0) for key, label in keys.items()}
+    return result
+
+  # Cache API ------------------------------------------------------------
+
+  def get(self, key, default=None, version=None):
+    value = self._state.l1.get(self._l1_key(key, version))
+    self._record(key, "l1", value is not _MISSING)
+    if value is not _MISSING:
+      return value
+    value = self.l2.get(key, _MISSING, version=version)
+    self._record(key, "l2", value is not _MISSING)
+    if value is _MISSING:
+      return default
+    self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+    return value
+
+  def get_many(self, keys, version=None):
+    found, remaining = {}, []
+    for key in keys:
+      value = self._state.l1.get(self._l1_key(key, version))
+      self._record(key, "l1", value is not _MISSING)
+      if value is _MISSING:
+        remaining.append(key)
+      else:
+        found[key] = value
+    if remaining:
+      fetched = self.l2.get_many(remaining, version=version)
+      for key in remaining:
+        self._record(key, "l2", key in fetched)
+      for key, value in fetched.items():
+        self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+      found.update(fetched)
+    return found
+
+  def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+    self.l2.set(key, value, timeout, version=version)
+    self._l1_set(key, value, timeout, version)
+
+  def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+    failed = self.l2.set_many(data, timeout, version=version)
+    for key, value in data.items():
+      if key not in failed:
+        self._l1_set(key, value, timeout, version)
+    return failed
+
+  def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+    added = self.l2.add(key, value, timeout, version=version)
+    if added:
+      self._l1_set(key, value, timeout, version)
+    return added
+
+  def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+    return self.l2.touch(key, timeout, version=version)
+
+  def incr(self, key, delta=1, version=None):
+    self._state.l1.delete(self._l1_key(key, version))
+    value = self.l2.incr(key, delta, version=version)
+    self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+    return value
+
+  def has_key(self, key, version=None):
+    return self.get(key, _MISSING, version=version) is not _MISSING
+
+  def delete(self, key, version=None):
+    self._state.l1.delete(self._l1_key(key, version))
+    return self.l2.delete(key, version=version)
+
+  def delete_many(self, keys, version=None):
+    for key in keys:
+      self._state.l1.delete(self._l1_key(key, version))
+    self.l2.delete_many(keys, version=version)
+
+  def clear(self):
+    self._state.l1.clear()
+    self.l2.clear()
+
+  def close(self, **kwargs):
+    self.l2.close(**kwargs)
+
+  def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+    value = self.get(key, _MISSING, version=version)
+    if value is not _MISSING:
+      return value
+    compute = default if callable(default) else (lambda: default)
+
+    state = self._state
+    flight_key = self._l1_key(key, version)
+    with state.lock:
+      flight = state.flights.get(flight_key)
+      leader = flight is None
+      if leader:
+        flight = state.flights[flight_key] = threading.Event()
+    if not leader:
+      # Another thread of this process is computing it.
+      flight.wait(self.lock_timeout)
+      value = self.get(key, _MISSING, version=version)
+      if value is not _MISSING:
+        return value
+      return self._compute(key, compute, timeout, version)
+    try:
+      return self._compute(key, compute, timeout, version)
+    finally:
+      with state.lock:
+        state.flights.pop(flight_key, None)
+      flight.set()
+
+  def _compute(self, key, compute, timeout, version):
+    lock_key = f"{key}:lock"
+    l2 = self.l2
+    if not l2.add(lock_key, 1, self.lock_timeout, version=version):
+      # Another process holds the lock: wait for its value, up to lock_timeout.
+      deadline = time.monotonic() + self.lock_timeout
+      while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = l2.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+          self._l1_set(key, value, timeout, version)
+          return value
+      lock_key = None
+    try:
+      value = compute()
+      self.set(key, value, timeout, version=version)
+      return value
+    finally:
+      if lock_key:
+        l2.delete(lock_key, version=version)
+
+
+def namespace_version(namespace):
+  key = f"{namespace}:version"
+  version = cache.get(key)
+  if version is None:
+    # Start from the clock, not 1, so a lost version key can't revive old entries.
+    cache.add(key, time.time_ns(), None)
+    version = cache.get(key)
+  return version
+
+
+def versioned_key(namespace, *parts):
+  return ":".join([namespace, str(namespace_version(namespace)), *map(str, parts)])
+
+
+def bump_namespace(namespace):
+  """Retire every versioned_key() of `namespace`. Returns the new version."""
+  key = f"{namespace}:version"
+  try:
+    return cache.incr(key)
+  except ValueError:
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def metrics():
+  backend = caches["default"]
+  return backend.metrics() if isinstance(backend, TieredCache) else {}
@@ -1,6 +1,15 @@
+from django.utils.functional import SimpleLazyObject
+from petalcart.cart import get_summary
+from shop.roles import is_shopowner
+
 def shopowner_status(request):
   if request.user.is_authenticated:
-    return {
-      "is_shopowner" : request.user.groups.filter(name = "ShopOwner").exists()
-    }
-  return {"is_shopowner" : False}
\ No newline at end of file
+    # Lazy: resolved (from the request, then the session) only if a template reads it.
+    return {"is_shopowner" : SimpleLazyObject(lambda: is_shopowner(request))}
+  return {"is_shopowner" : False}
+
+def cart_summary(request):
+  if request.user.is_authenticated:
+    # Lazy: only pages that actually show the cart badge touch the cache.
+    return {"cart_summary" : SimpleLazyObject(lambda: get_summary(request.user.id))}
+  return {"cart_summary" : None}
\ No newline at end of file
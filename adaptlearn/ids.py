@@ -0,0 +1,45 @@
+"""Time-ordered UUIDs (version 7, RFC 9562) for primary keys.
+
+A uuid4 key sends every insert to a random leaf of the primary key index
+and of every index that references it. A uuid7 starts with the Unix time
+in milliseconds, so new rows land at the right-hand edge of those indexes
+the way an auto-increment key does. The keys stay UUIDs, so URLs, cursors
+and foreign keys are unchanged. Rows created before the switch keep their
+uuid4 keys.
+
+Within one millisecond the 12-bit rand_a field is used as a counter
+(RFC 9562 section 6.2, method 1), so keys from one process are strictly
+increasing.
+"""
+import secrets
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+  global _last_ms, _counter
+  with _lock:
+    ms = time.time_ns() // 1_000_000
+    if ms > _last_ms:
+      _last_ms = ms
+      # Random start leaves room to count up within the millisecond.
+      _counter = secrets.randbits(11)
+    else:
+      _counter += 1
+      if _counter > 0xFFF:
+        # Counter exhausted (or the clock went back): borrow the next millisecond.
+        _last_ms += 1
+        _counter = secrets.randbits(11)
+      ms = _last_ms
+    counter = _counter
+  value = (ms & 0xFFFF_FFFF_FFFF) << 80
+  value |= 0x7 << 76
+  value |= counter << 64
+  value |= 0b10 << 62
+  value |= secrets.randbits(62)
+  return uuid.UUID(int = value)
@@ -0,0 +1,132 @@
+"""Serve MEDIA_ROOT in production.
+
+Content-hashed names (adaptlearn.storage) are served with a one-year
+immutable Cache-Control, so browsers never revalidate them; anything else
+gets a short max-age. Every response carries an ETag and Last-Modified and
+answers If-None-Match / If-Modified-Since with 304. Full responses go out as
+a FileResponse, which WSGI servers send with os.sendfile(); a single byte
+range is answered with 206. When MEDIA_ACCEL_REDIRECT is set (nginx in
+front, with an internal location aliasing MEDIA_ROOT), the view only checks
+the request and hands the transfer to the proxy via X-Accel-Redirect.
+
+Media is served from the site's own origin, so only image types are ever
+labelled as such: the Content-Type comes from a fixed table of image
+extensions, anything else goes out as an application/octet-stream
+attachment, and every response carries nosniff and a sandboxing CSP.
+
+upload() is the local stand-in for an S3 presigned POST (see
+adaptlearn.storage.SignedUploadMixin).
+"""
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+
+from .storage import is_hashed, read_upload_policy
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=3600"
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CONTENT_TYPES = {
+  ".jpg" : "image/jpeg",
+  ".jpeg" : "image/jpeg",
+  ".png" : "image/png",
+  ".gif" : "image/gif",
+  ".webp" : "image/webp",
+  ".avif" : "image/avif",
+}
+
+
+def _byte_range(header, size):
+  """(start, end) inclusive for a single satisfiable range, None to send it all, False if unsatisfiable."""
+  match = RANGE.match(header.strip())
+  if not match or match.groups() == ("", ""):
+    return None  # multiple or malformed ranges: ignore the header
+  first, last = match.groups()
+  if first:
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+  else:
+    start, end = max(size - int(last), 0), size - 1
+  if start > end or start >= size:
+    return False
+  return start, end
+
+
+@require_safe
+def serve(request, path):
+  try:
+    fullpath = safe_join(settings.MEDIA_ROOT, path)
+  except SuspiciousFileOperation:
+    raise Http404("Not found")
+  try:
+    stat = os.stat(fullpath)
+  except (FileNotFoundError, NotADirectoryError):
+    raise Http404("Not found")
+  if not os.path.isfile(fullpath):
+    raise Http404("Not found")
+
+  etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+  headers = {
+    "ETag" : etag,
+    "Last-Modified" : http_date(stat.st_mtime),
+    "Cache-Control" : IMMUTABLE if is_hashed(path) else REVALIDATE,
+    "Accept-Ranges" : "bytes",
+    "X-Content-Type-Options" : "nosniff",
+    "Content-Security-Policy" : "default-src 'none'; sandbox",
+  }
+  content_type = CONTENT_TYPES.get(os.path.splitext(path)[1].lower())
+  if content_type is None:
+    content_type = "application/octet-stream"
+    headers["Content-Disposition"] = "attachment"
+  not_modified = get_conditional_response(request, etag = etag, last_modified = int(stat.st_mtime))
+  if not_modified is not None:
+    for name, value in headers.items():
+      not_modified[name] = value
+    return not_modified
+
+  if settings.MEDIA_ACCEL_REDIRECT:
+    response = HttpResponse(content_type = content_type)
+    response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT.rstrip("/") + "/" + path
+  else:
+    byte_range = None
+    if "HTTP_RANGE" in request.META and request.META.get("HTTP_IF_RANGE", etag) == etag:
+      byte_range = _byte_range(request.META["HTTP_RANGE"], stat.st_size)
+    if byte_range is False:
+      response = HttpResponse(status = 416)
+      response["Content-Range"] = f"bytes */{stat.st_size}"
+    elif byte_range:
+      start, end = byte_range
+      with open(fullpath, "rb") as fh:
+        fh.seek(start)
+        response = HttpResponse(fh.read(end - start + 1), status = 206, content_type = content_type)
+      response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    else:
+      response = FileResponse(open(fullpath, "rb"), content_type = content_type)
+      response["Content-Length"] = stat.st_size
+  for name, value in headers.items():
+    response[name] = value
+  return response
+
+
+@csrf_exempt  # authorised by the signed policy, as a presigned S3 POST is
+@require_POST
+def upload(request):
+  policy = read_upload_policy(request.POST.get("policy", ""))
+  if policy is None:
+    return HttpResponseForbidden("Upload policy is invalid or expired")
+  upload = request.FILES.get("file")
+  if upload is None or not 0 < upload.size <= policy["max"]:
+    return HttpResponseBadRequest("File is missing or too large")
+  if request.POST.get("Content-Type") != policy["type"] or default_storage.exists(policy["name"]):
+    return HttpResponseBadRequest("Upload does not match its policy")
+  default_storage.save(policy["name"], upload)
+  return HttpResponse(status = 204)
@@ -0,0 +1,107 @@
+"""Read replicas for the catalog and order history pages.
+
+Every write, and every read outside a @replica_reads view, goes to the
+primary ("default"). Inside a @replica_reads view, reads go to a random
+alias of settings.REPLICA_DATABASES (configured from DATABASE_REPLICA_URLS),
+unless the view has already written, is inside a transaction on the
+primary, or the visitor is pinned.
+
+Replicas lag the primary, so ReplicaPinningMiddleware pins a visitor to
+the primary for REPLICA_PIN_SECONDS after any request of theirs that wrote
+(or was a POST/PUT/PATCH/DELETE), via a signed cookie. That way a buyer
+sees their own order and a shop owner their own stock change straight
+away (read-your-writes), while everyone else reads the replicas.
+"""
+import functools
+import random
+from contextvars import ContextVar
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = "db_pin"
+PIN_SALT = "adaptlearn.routers.pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+# Session rows are written on most requests and never shown back.
+UNTRACKED_APPS = {"sessions"}
+
+
+class _RequestState:
+  def __init__(self, pinned = False):
+    self.pinned = pinned
+    self.wrote = False
+
+
+_request = ContextVar("db_request", default = None)
+# None, or how many atomic blocks were open on the primary when replica
+# reads were enabled.
+_replica_reads = ContextVar("db_replica_reads", default = None)
+
+
+@contextmanager
+def _replica_reads_from(depth):
+  token = _replica_reads.set(depth)
+  try:
+    yield
+  finally:
+    _replica_reads.reset(token)
+
+
+def use_primary():
+  """Context manager: read from the primary even inside a @replica_reads view."""
+  return _replica_reads_from(None)
+
+
+def replica_reads(view):
+  """Let `view` read from a replica (see the module docstring for the exceptions)."""
+  @functools.wraps(view)
+  def wrapper(request, *args, **kwargs):
+    with _replica_reads_from(len(connections[DEFAULT_DB_ALIAS].atomic_blocks)):
+      return view(request, *args, **kwargs)
+  return wrapper
+
+
+def pinned():
+  state = _request.get()
+  return state is not None and (state.pinned or state.wrote)
+
+
+class ReplicaRouter:
+  def db_for_read(self, model, **hints):
+    replicas = settings.REPLICA_DATABASES
+    depth = _replica_reads.get()
+    if not replicas or depth is None or pinned():
+      return DEFAULT_DB_ALIAS
+    if len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > depth:
+      # The view opened a transaction; reads inside it must see its writes.
+      return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+  def db_for_write(self, model, **hints):
+    state = _request.get()
+    if state is not None and model._meta.app_label not in UNTRACKED_APPS:
+      state.wrote = True
+    return DEFAULT_DB_ALIAS
+
+  def allow_relation(self, obj1, obj2, **hints):
+    # The replicas hold the same rows as the primary.
+    return True
+
+
+class ReplicaPinningMiddleware:
+  def __init__(self, get_response):
+    self.get_response = get_response
+
+  def __call__(self, request):
+    state = _RequestState(pinned = request.get_signed_cookie(
+      PIN_COOKIE, default = None, salt = PIN_SALT, max_age = settings.REPLICA_PIN_SECONDS) is not None)
+    token = _request.set(state)
+    try:
+      response = self.get_response(request)
+    finally:
+      _request.reset(token)
+    if settings.REPLICA_DATABASES and (state.wrote or request.method not in SAFE_METHODS):
+      response.set_signed_cookie(PIN_COOKIE, "1", salt = PIN_SALT, max_age = settings.REPLICA_PIN_SECONDS,
+                                 secure = request.is_secure(), httponly = True, samesite = "Lax")
+    return response
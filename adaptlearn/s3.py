@@ -0,0 +1,43 @@
+"""Media on S3 or any S3-compatible store (MinIO, Cloudflare R2, ...).
+
+Selected in settings when MEDIA_S3_BUCKET is set; requires
+django-storages[s3]. One boto3 client per process keeps a pool of
+keep-alive connections (max_pool_connections), and uploads above
+multipart_threshold go up as parallel multipart parts.
+"""
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+from .storage import ContentHashMixin
+
+MB = 1024 * 1024
+
+
+class HashedS3Storage(ContentHashMixin, S3Storage):
+  def __init__(self, pool_size = 20, multipart_threshold_mb = 8, multipart_chunk_mb = 8,
+               upload_concurrency = 4, **options):
+    options.setdefault("client_config", Config(
+      max_pool_connections = pool_size,
+      connect_timeout = 5,
+      read_timeout = 30,
+      retries = {"max_attempts" : 3, "mode" : "standard"},
+    ))
+    options.setdefault("transfer_config", TransferConfig(
+      multipart_threshold = multipart_threshold_mb * MB,
+      multipart_chunksize = multipart_chunk_mb * MB,
+      max_concurrency = upload_concurrency,
+      use_threads = True,
+    ))
+    super().__init__(**options)
+
+  def presigned_upload(self, name, content_type, max_size, expires = 600):
+    post = self.connection.meta.client.generate_presigned_post(
+      Bucket = self.bucket_name,
+      Key = self._normalize_name(clean_name(name)),
+      Fields = {"Content-Type" : content_type},
+      Conditions = [{"Content-Type" : content_type}, ["content-length-range", 1, max_size]],
+      ExpiresIn = expires,
+    )
+    return {"url" : post["url"], "fields" : post["fields"]}
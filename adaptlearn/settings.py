@@ -28,7 +28,7 @@ except Exception:
 # ---------------------------------------
 SECRET_KEY = os.environ.get("SECRET_KEY","TANUJ_KEY")
 
-DEBUG = True
+DEBUG = os.environ.get("DEBUG", "True").lower() in ("1", "true", "yes")
 
 ALLOWED_HOSTS = [
     "*",
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'petalcart.apps.BaseConfig',
     'accounts',
     'shop',
+    'jobs',
 ]
 
 # ---------------------------------------
@@ -62,6 +63,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'adaptlearn.routers.ReplicaPinningMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -81,6 +83,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'adaptlearn.context_processors.shopowner_status',
+                'adaptlearn.context_processors.cart_summary',
             ],
         },
     },
@@ -114,13 +117,98 @@ DATABASE_URL = (os.environ.get("DATABASE_URL") or "").strip()
 if not DATABASE_URL:
     raise ImproperlyConfigured("DATABASE_URL environment variable is required")
 
+def env_flag(name, default=False):
+    return (os.environ.get(name) or str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Behind PgBouncer in transaction mode a session can't outlive a transaction,
+# so no server-side cursors (named cursors) and no prepared statements.
+DB_PGBOUNCER = env_flag("DB_PGBOUNCER")
+# psycopg 3 connection pool shared by the threads of each worker process.
+DB_POOL = env_flag("DB_POOL")
+
 DATABASES = {
     'default': dj_database_url.parse(
         DATABASE_URL,
-        conn_max_age=600,
+        # Pooled connections go back to the pool after each request instead.
+        conn_max_age=0 if DB_POOL else int(os.environ.get("DB_CONN_MAX_AGE", 600)),
+        # Ping a reused connection before the request's first query, so a
+        # connection the server dropped is replaced instead of raising a 500.
+        conn_health_checks=env_flag("DB_CONN_HEALTH_CHECKS", True),
+        disable_server_side_cursors=DB_PGBOUNCER,
     )
 }
 
+# Read replicas: extra URLs, comma-separated, parsed like DATABASE_URL. The
+# catalog and order history views read from them (adaptlearn.routers); a
+# visitor who just wrote reads the primary for REPLICA_PIN_SECONDS.
+REPLICA_DATABASES = []
+for number, url in enumerate(filter(None, (u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(","))), 1):
+    alias = f"replica{number}"
+    DATABASES[alias] = dj_database_url.parse(
+        url,
+        conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+        conn_health_checks=DATABASES['default']['CONN_HEALTH_CHECKS'],
+        disable_server_side_cursors=DB_PGBOUNCER,
+    )
+    # No test database of its own: under test it reads the primary's.
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(alias)
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 15))
+
+DATABASE_ROUTERS = ['adaptlearn.routers.ReplicaRouter']
+
+# Full-text / trigram search lookups (petalcart.search) on PostgreSQL.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+for db in DATABASES.values():
+    if db['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    DB_OPTIONS = db.setdefault('OPTIONS', {})
+    if DB_POOL:
+        DB_OPTIONS['pool'] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            # Seconds a request waits for a free connection before failing.
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", 600)),
+            "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", 3600)),
+        }
+    # psycopg 3 prepares a statement server-side once it has run this many
+    # times on a connection; off (None) under PgBouncer.
+    if DB_PGBOUNCER:
+        DB_OPTIONS['prepare_threshold'] = None
+    elif os.environ.get("DB_PREPARE_THRESHOLD"):
+        DB_OPTIONS['prepare_threshold'] = int(os.environ["DB_PREPARE_THRESHOLD"])
+
+# ---------------------------------------
+# CACHE
+# ---------------------------------------
+# adaptlearn.cache: a per-process LRU (L1) in front of a cache shared by all
+# workers (L2): Redis when REDIS_URL is set, otherwise files under CACHE_DIR.
+# (Tests swap L2 for an in-memory cache; see adaptlearn.test_settings.)
+REDIS_URL = (os.environ.get("REDIS_URL") or "").strip()
+if REDIS_URL:
+    SHARED_CACHE = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}
+else:
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_DIR") or str(BASE_DIR / ".cache"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+CACHES = {
+    "default": {
+        "BACKEND": "adaptlearn.cache.TieredCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            "L1_MAX_ENTRIES": int(os.environ.get("CACHE_L1_MAX_ENTRIES", 1000)),
+            # Longest a worker may serve a value another worker has replaced.
+            "L1_TIMEOUT": int(os.environ.get("CACHE_L1_TIMEOUT", 5)),
+        },
+    },
+    "shared": SHARED_CACHE,
+}
+
 # ---------------------------------------
 # PASSWORD VALIDATION
 # ---------------------------------------
@@ -145,7 +233,18 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+# collectstatic bundles and minifies these stylesheets (adaptlearn.assets);
+# templates pick one per page with {% stylesheet "<name>" %}. Hashed names
+# are only used with DEBUG off.
+STATIC_BUNDLES = {
+    "base": ["css/common.css"],
+    "catalog": ["css/common.css", "css/home.css"],
+    "flower": ["css/common.css", "css/shop.css"],
+    "cart": ["css/common.css", "css/cart.css"],
+    "form": ["css/common.css", "css/forms.css"],
+    "payment": ["css/common.css", "css/forms.css", "css/payment.css"],
+    "about": ["css/common.css", "css/about_us.css"],
+}
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 # ---------------------------------------
@@ -153,6 +252,47 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 # ---------------------------------------
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Uploads are stored under content-hashed names (adaptlearn.storage) and
+# served by adaptlearn.media. Behind nginx, set MEDIA_ACCEL_REDIRECT to an
+# internal location that aliases MEDIA_ROOT to let nginx send the bytes.
+MEDIA_ACCEL_REDIRECT = (os.environ.get("MEDIA_ACCEL_REDIRECT") or "").strip()
+STORAGES = {
+    "default": {"BACKEND": "adaptlearn.storage.HashedFileSystemStorage"},
+    "staticfiles": {"BACKEND": "adaptlearn.assets.BundledManifestStaticFilesStorage"},
+}
+
+# Shared media for multi-host deployments: any S3-compatible bucket
+# (set MEDIA_S3_ENDPOINT_URL for MinIO/R2). Needs django-storages[s3].
+MEDIA_S3_BUCKET = (os.environ.get("MEDIA_S3_BUCKET") or "").strip()
+if MEDIA_S3_BUCKET:
+    STORAGES["default"] = {
+        "BACKEND": "adaptlearn.s3.HashedS3Storage",
+        "OPTIONS": {
+            "bucket_name": MEDIA_S3_BUCKET,
+            "endpoint_url": os.environ.get("MEDIA_S3_ENDPOINT_URL") or None,
+            "region_name": os.environ.get("MEDIA_S3_REGION") or None,
+            "access_key": os.environ.get("MEDIA_S3_ACCESS_KEY") or None,
+            "secret_key": os.environ.get("MEDIA_S3_SECRET_KEY") or None,
+            "custom_domain": os.environ.get("MEDIA_S3_CUSTOM_DOMAIN") or None,
+            "querystring_auth": False,
+            "file_overwrite": False,
+            "default_acl": None,
+            # Names are content-hashed (adaptlearn.storage), so objects never change.
+            "object_parameters": {"CacheControl": "public, max-age=31536000, immutable"},
+            "pool_size": int(os.environ.get("MEDIA_S3_POOL_SIZE", 20)),
+            "multipart_threshold_mb": int(os.environ.get("MEDIA_S3_MULTIPART_THRESHOLD_MB", 8)),
+            "multipart_chunk_mb": int(os.environ.get("MEDIA_S3_MULTIPART_CHUNK_MB", 8)),
+            "upload_concurrency": int(os.environ.get("MEDIA_S3_UPLOAD_CONCURRENCY", 4)),
+        },
+    }
+
+# Largest image a shop owner may upload straight to storage.
+FLOWER_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+
+# Resized copies of Flower.img (petalcart.images), widths in pixels.
+# AVIF is skipped when the installed Pillow cannot encode it.
+FLOWER_IMAGE_WIDTHS = (160, 320, 640, 960)
+FLOWER_IMAGE_FORMATS = ('avif', 'webp')
 
 # ---------------------------------------
 # DEFAULT FIELD
@@ -169,3 +309,33 @@ LOGIN_URL = '/accounts/login/'
 # ---------------------------------------
 RAZORPAY_KEY_ID = (os.environ.get("RAZORPAY_KEY_ID") or "").strip()
 RAZORPAY_KEY_SECRET = (os.environ.get("RAZORPAY_KEY_SECRET") or "").strip()
+# Secret configured on the Razorpay dashboard for webhooks/razorpay/.
+RAZORPAY_WEBHOOK_SECRET = (os.environ.get("RAZORPAY_WEBHOOK_SECRET") or "").strip()
+# Point at `manage.py fake_razorpay` (e.g. http://127.0.0.1:8765) to run offline.
+RAZORPAY_BASE_URL = (os.environ.get("RAZORPAY_BASE_URL") or "").strip()
+# (connect, read) seconds for every gateway call.
+RAZORPAY_TIMEOUT = (
+    float(os.environ.get("RAZORPAY_CONNECT_TIMEOUT", 3)),
+    float(os.environ.get("RAZORPAY_READ_TIMEOUT", 10)),
+)
+RAZORPAY_MAX_RETRIES = int(os.environ.get("RAZORPAY_MAX_RETRIES", 3))
+RAZORPAY_BACKOFF = float(os.environ.get("RAZORPAY_BACKOFF", 0.3))
+RAZORPAY_POOL_SIZE = int(os.environ.get("RAZORPAY_POOL_SIZE", 10))
+
+# ---------------------------------------
+# STOCK RESERVATIONS
+# ---------------------------------------
+# Seconds a cart checkout holds stock while Razorpay payment is pending.
+STOCK_HOLD_TTL = int(os.environ.get("STOCK_HOLD_TTL", 15 * 60))
+
+# ---------------------------------------
+# BACKGROUND JOBS (manage.py runworker)
+# ---------------------------------------
+# A claimed job is handed to another worker if not finished within this.
+JOBS_LEASE_SECONDS = int(os.environ.get("JOBS_LEASE_SECONDS", 300))
+
+# ---------------------------------------
+# EMAIL (order notifications, sent by the job worker)
+# ---------------------------------------
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "PetalCart <orders@petalcart.local>")
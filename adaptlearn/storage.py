@@ -0,0 +1,130 @@
+"""Media storage: content-hashed names and direct browser uploads.
+
+pics/rose.jpg is stored as pics/rose.3f2a9c1b7d4e.jpg (the first 12 hex
+digits of its SHA-256). A name therefore never points at different bytes,
+which is what lets adaptlearn.media serve media as immutable.
+
+Storages with a presigned_upload() method accept uploads straight from the
+browser: it returns {"url", "fields"} in the shape of an S3 presigned POST,
+and the browser POSTs those fields plus `file` to the url. The S3 backend
+(adaptlearn.s3) signs a real S3 policy; the local storages below sign one
+for adaptlearn.media.upload, so the same browser code runs in development,
+in tests and against S3 or MinIO.
+"""
+import hashlib
+import os
+import re
+import secrets
+import time
+
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+from django.urls import reverse
+from PIL import Image
+
+HASH_LENGTH = 12
+# ".<hash>" plus the "_xxxxxxx" suffix get_available_name() adds on a clash.
+HASH_SUFFIX = re.compile(r"\.[0-9a-f]{%d}(?:_[0-9A-Za-z]{7})?$" % HASH_LENGTH)
+
+
+def content_hash(content):
+  digest = hashlib.sha256()
+  if hasattr(content, "seek"):
+    content.seek(0)
+  for chunk in content.chunks():
+    digest.update(chunk)
+  if hasattr(content, "seek"):
+    content.seek(0)
+  return digest.hexdigest()[:HASH_LENGTH]
+
+
+def is_hashed(name):
+  stem, _ext = os.path.splitext(name)
+  return bool(HASH_SUFFIX.search(stem))
+
+
+# Content types a browser may upload directly, with the extension (and so
+# the Content-Type adaptlearn.media serves) the stored name gets, and the
+# Pillow format the bytes must turn out to be.
+UPLOAD_IMAGE_TYPES = {
+  "image/jpeg" : (".jpg", "JPEG"),
+  "image/png" : (".png", "PNG"),
+  "image/webp" : (".webp", "WEBP"),
+  "image/gif" : (".gif", "GIF"),
+}
+
+
+def unique_name(content_type, prefix = "pics/"):
+  """A never-reused name for a direct upload, e.g. pics/upload.9c04e1d27b3a.jpg.
+
+  The server never sees the bytes, so a random token takes the place of the
+  content hash; the name is still written once and never overwritten. The
+  client's filename is not used: the extension comes from the (allowed)
+  content type.
+  """
+  ext, _format = UPLOAD_IMAGE_TYPES[content_type]
+  return f"{prefix}upload.{secrets.token_hex(HASH_LENGTH // 2)}{ext}"
+
+
+def is_uploaded_image(name, storage):
+  """True if the direct upload stored under `name` is an image of the type its extension claims."""
+  formats = {ext : format for ext, format in UPLOAD_IMAGE_TYPES.values()}
+  expected = formats.get(os.path.splitext(name)[1])
+  try:
+    with storage.open(name) as fh, Image.open(fh) as image:
+      image.verify()
+      return expected is not None and image.format == expected
+  except Exception:
+    return False
+
+
+def original_stem(name):
+  """pics/rose.3f2a9c1b7d4e.jpg -> pics/rose"""
+  stem, _ext = os.path.splitext(name)
+  return HASH_SUFFIX.sub("", stem)
+
+
+class ContentHashMixin:
+  def save(self, name, content, max_length = None):
+    if name is None:
+      name = content.name
+    if not hasattr(content, "chunks"):
+      content = File(content, name)
+    if not is_hashed(name):
+      stem, ext = os.path.splitext(name)
+      name = f"{stem}.{content_hash(content)}{ext}"
+    # Equal content under an existing name gets the usual random suffix
+    # rather than sharing the file, so deleting one flower's files never
+    # removes another's.
+    return super().save(name, content, max_length = max_length)
+
+
+UPLOAD_SALT = "adaptlearn.storage.upload"
+
+
+class SignedUploadMixin:
+  """presigned_upload() for storages without an upload endpoint of their own."""
+
+  def presigned_upload(self, name, content_type, max_size, expires = 600):
+    policy = signing.dumps({"name" : name, "type" : content_type, "max" : max_size,
+                            "exp" : int(time.time()) + expires}, salt = UPLOAD_SALT)
+    return {"url" : reverse("media_upload"),
+            "fields" : {"policy" : policy, "Content-Type" : content_type}}
+
+
+def read_upload_policy(policy):
+  """The policy signed by presigned_upload(), or None if forged or expired."""
+  try:
+    data = signing.loads(policy, salt = UPLOAD_SALT)
+  except signing.BadSignature:
+    return None
+  return data if data["exp"] >= time.time() else None
+
+
+class HashedFileSystemStorage(ContentHashMixin, SignedUploadMixin, FileSystemStorage):
+  pass
+
+
+class HashedInMemoryStorage(ContentHashMixin, SignedUploadMixin, InMemoryStorage):
+  """For tests: the production naming and upload flow without touching disk."""
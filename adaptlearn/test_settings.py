@@ -0,0 +1,16 @@
+"""Settings for the test suite: adaptlearn.settings plus test-only overrides.
+
+`manage.py test` uses this module by default; with any other runner set
+DJANGO_SETTINGS_MODULE=adaptlearn.test_settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+# A private in-memory L2, so tests never read or wipe a developer's file
+# cache or Redis.
+CACHES["shared"] = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}
+
+# Tests read the primary unless they route to this mirror of it themselves
+# (override_settings(REPLICA_DATABASES=["replica"])), whatever
+# DATABASE_REPLICA_URLS says.
+DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+REPLICA_DATABASES = []
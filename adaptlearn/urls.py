@@ -17,14 +17,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from . import media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('',include('petalcart.urls')),
     path('accounts/',include('accounts.urls'),name = "accounts"),
     path('shop/',include('shop.urls')),
+    path('media-upload/', media.upload, name = "media_upload"),
+    # Media (uploads): ETag/304, byte ranges, immutable caching of hashed names.
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", media.serve, name = "media"),
 ]
-
-# Serve media files
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,83 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobs import queue
+
+
+def work(worker_id, stop, poll_interval, burst=False):
+    """Claim and run jobs until `stop` is set (or, in burst mode, the queue is empty)."""
+    while not stop.is_set():
+        close_old_connections()
+        jobs = queue.claim(worker_id)
+        if jobs:
+            queue.run(jobs[0])
+        elif burst:
+            break
+        else:
+            stop.wait(poll_interval)
+    connections.close_all()
+
+
+def run_threads(prefix, threads, stop, poll_interval, burst=False):
+    pool = [threading.Thread(target=work, args=(f"{prefix}/t{i}", stop, poll_interval, burst),
+                             name=f"job-worker-{i}", daemon=True)
+            for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        while thread.is_alive():
+            thread.join(0.5)
+
+
+def run_process(prefix, threads, poll_interval, burst):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    run_threads(prefix, threads, stop, poll_interval, burst)
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue (jobs.Job) until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4,
+                            help="Worker threads per process (I/O-bound jobs).")
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Worker processes (CPU-bound jobs such as image resizing).")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds an idle worker waits before polling again.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once the queue is empty instead of polling forever.")
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'])
+        processes = max(1, options['processes'])
+        poll_interval = options['poll_interval']
+        burst = options['burst']
+        prefix = queue.default_worker_id()
+        self.stdout.write(f"Job worker {prefix}: {processes} process(es) x {threads} thread(s)")
+
+        if processes == 1:
+            run_process(prefix, threads, poll_interval, burst)
+            return
+
+        # Children must not share the parent's database sockets.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [context.Process(target=run_process,
+                                    args=(f"{prefix}/p{i}", threads, poll_interval, burst))
+                    for i in range(processes)]
+        for child in children:
+            child.start()
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
+            for child in children:
+                child.join()
@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+  QUEUED = 'Queued'
+  RUNNING = 'Running'
+  DONE = 'Done'
+  FAILED = 'Failed'
+  STATUS_CHOICES = [
+    (QUEUED, 'Queued'),
+    (RUNNING, 'Running'),
+    (DONE, 'Done'),
+    (FAILED, 'Failed'),
+  ]
+  name = models.CharField(max_length = 100)
+  payload = models.JSONField(default = dict)
+  status = models.CharField(max_length = 10, choices = STATUS_CHOICES, default = QUEUED)
+  attempts = models.PositiveIntegerField(default = 0)
+  max_attempts = models.PositiveIntegerField(default = 5)
+  run_at = models.DateTimeField(default = timezone.now)
+  locked_until = models.DateTimeField(null = True, blank = True)
+  locked_by = models.CharField(max_length = 100, blank = True)
+  last_error = models.TextField(blank = True)
+  created = models.DateTimeField(auto_now_add = True)
+  finished = models.DateTimeField(null = True, blank = True)
+
+  class Meta:
+    indexes = [
+      # Workers poll for due jobs by status and run_at.
+      models.Index(fields = ['status', 'run_at'], name = 'job_due_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.name} #{self.pk} ({self.status})"
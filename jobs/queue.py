@@ -0,0 +1,102 @@
+"""A small database-backed job queue.
+
+Register a handler with @job in an app's tasks.py and call enqueue() from a
+view. The job row is inserted in the caller's transaction, so it exists if
+and only if the surrounding write committed. `manage.py runworker` claims
+due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers
+can poll the same table without handing a job out twice. A claim is a
+lease: if a worker dies mid-job, the job is handed out again once
+JOBS_LEASE_SECONDS have passed, so handlers must be safe to re-run.
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def job(name=None, max_attempts=5):
+    """Register the decorated function as a job handler, called with the payload as kwargs."""
+    def register(func):
+        job_name = name or f"{func.__module__}.{func.__name__}"
+        func.job_name = job_name
+        func.max_attempts = max_attempts
+        registry[job_name] = func
+        return func
+    return register
+
+
+def enqueue(handler, run_at=None, **payload):
+    """Queue `handler` (a @job function or its name) to run with `payload` (JSON-serialisable)."""
+    name = getattr(handler, "job_name", handler)
+    max_attempts = getattr(registry.get(name), "max_attempts", 5)
+    return Job.objects.create(name=name, payload=payload, max_attempts=max_attempts,
+                              run_at=run_at or timezone.now())
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker_id, batch_size=1):
+    """Lease up to `batch_size` due jobs to `worker_id`."""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(Job.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(Q(status=Job.QUEUED, run_at__lte=now)
+                            | Q(status=Job.RUNNING, locked_until__lt=now))
+                    .order_by('run_at')[:batch_size])
+        if jobs:
+            Job.objects.filter(pk__in=[j.pk for j in jobs]).update(
+                status=Job.RUNNING, locked_by=worker_id,
+                locked_until=now + timedelta(seconds=settings.JOBS_LEASE_SECONDS))
+    return jobs
+
+
+def run(job):
+    handler = registry.get(job.name)
+    attempts = job.attempts + 1
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job {job.name!r}")
+        handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s #%s failed (attempt %s)", job.name, job.pk, attempts)
+        if attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, attempts=attempts, last_error=error,
+                                                 locked_until=None, finished=timezone.now())
+        else:
+            # Exponential backoff: 2, 4, 8, ... seconds.
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED, attempts=attempts, last_error=error, locked_until=None,
+                run_at=timezone.now() + timedelta(seconds=2 ** attempts))
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, attempts=attempts, locked_until=None,
+                                         finished=timezone.now())
+    return True
+
+
+def run_pending(worker_id=None, limit=None):
+    """Run due jobs in this thread until none are left (or `limit` ran). Returns the count."""
+    worker_id = worker_id or default_worker_id()
+    ran = 0
+    while limit is None or ran < limit:
+        jobs = claim(worker_id)
+        if not jobs:
+            break
+        run(jobs[0])
+        ran += 1
+    return ran
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from . import queue
+from .models import Job
+
+calls = []
+
+
+@queue.job(name="tests.record", max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@queue.job(name="tests.explode", max_attempts=2)
+def explode():
+    raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueued_jobs_run_once(self):
+        queue.enqueue(record, value=1)
+        queue.enqueue("tests.record", value=2)
+        self.assertEqual(queue.run_pending(), 2)
+        self.assertEqual(queue.run_pending(), 0)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(set(Job.objects.values_list("status", flat=True)), {Job.DONE})
+
+    def test_claimed_jobs_are_not_handed_out_twice(self):
+        queue.enqueue(record, value=1)
+        self.assertEqual(len(queue.claim("worker-a")), 1)
+        self.assertEqual(queue.claim("worker-b"), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        job = queue.enqueue(record, value=1)
+        queue.claim("worker-a")
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([j.pk for j in queue.claim("worker-b")], [job.pk])
+
+    def test_failures_back_off_then_give_up(self):
+        job = queue.enqueue(explode)
+        with self.assertLogs("jobs.queue", "ERROR"):
+            queue.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs("jobs.queue", "ERROR"):
+            queue.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn("boom", job.last_error)
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'adaptlearn.settings')
+    # `manage.py test` runs on adaptlearn.test_settings.
+    default_settings = 'adaptlearn.test_settings' if sys.argv[1:2] == ['test'] else 'adaptlearn.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
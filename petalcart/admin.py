@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Flower,Comment,FlowerShop,Order,OrderItem,Cart,CartItem
+from .models import Flower,Comment,FlowerShop,Order,OrderItem,Cart,CartItem,PaymentEvent
 
 admin.site.register(Flower)
 admin.site.register(Comment)
@@ -9,4 +9,5 @@ admin.site.register(FlowerShop)
 admin.site.register(OrderItem)
 admin.site.register(Order)
 admin.site.register(CartItem)
-admin.site.register(Cart)
\ No newline at end of file
+admin.site.register(Cart)
+admin.site.register(PaymentEvent)
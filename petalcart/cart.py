@@ -0,0 +1,73 @@
+"""Per-user cart summary (item count and total), cached between cart writes.
+
+The navbar shows it on every page, so it is read from the cache and only
+recomputed after a CartItem save/delete invalidates it (petalcart.signals).
+"""
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Window
+
+from .models import CartItem
+
+SUMMARY_TIMEOUT = 60 * 60
+
+# Set while empty_cart() deletes a cart's lines, so the per-line signal
+# doesn't look up each line's cart only to invalidate the same summary.
+_emptying = ContextVar("cart_emptying", default = False)
+
+
+def summary_key(user_id):
+  return f"cart-summary:{user_id}"
+
+
+def line_total():
+  return ExpressionWrapper(F('quantity') * F('flower__price'),
+                           output_field = DecimalField(max_digits = 12, decimal_places = 2))
+
+
+def cart_items(user):
+  """The user's cart lines with flower and stock, each annotated with `subtotal`
+  and the whole cart's `cart_total`, in a single query."""
+  return (CartItem.objects
+          .filter(cart__user = user)
+          .select_related('flower__stock')
+          .annotate(subtotal = line_total(), cart_total = Window(Sum(line_total())))
+          .order_by('id'))
+
+
+def get_summary(user_id):
+  def compute():
+    totals = CartItem.objects.filter(cart__user_id = user_id).aggregate(
+      count = Sum('quantity'), total = Sum(line_total()))
+    return {"count" : totals["count"] or 0, "total" : totals["total"] or Decimal("0")}
+  return cache.get_or_set(summary_key(user_id), compute, SUMMARY_TIMEOUT)
+
+
+def store_summary(user_id, items):
+  """Prime the cache from already-loaded cart_items() rows."""
+  summary = {
+    "count" : sum(item.quantity for item in items),
+    "total" : items[0].cart_total if items else Decimal("0"),
+  }
+  cache.set(summary_key(user_id), summary, SUMMARY_TIMEOUT)
+  return summary
+
+
+def invalidate_summary(user_id):
+  cache.delete(summary_key(user_id))
+
+
+def emptying_cart():
+  return _emptying.get()
+
+
+def empty_cart(user_id):
+  """Delete all of the user's cart lines and invalidate their summary once."""
+  token = _emptying.set(True)
+  try:
+    CartItem.objects.filter(cart__user_id = user_id).delete()
+  finally:
+    _emptying.reset(token)
+  invalidate_summary(user_id)
@@ -0,0 +1,42 @@
+"""Catalog pages and flower details, cached in the "catalog" namespace.
+
+A page is cached whole, with stock, shop and latest comment already
+attached, so a warm catalog request runs no catalog queries. Every change
+that can alter a card bumps the namespace (petalcart.signals and
+Flower.objects.bump_card_version()), which retires all cached pages at once.
+Cache fills read the primary: a fill from a lagging replica right after a
+bump would cache the old page for CATALOG_TIMEOUT.
+"""
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from adaptlearn.cache import versioned_key
+from adaptlearn.routers import use_primary
+
+from .models import CATALOG_CACHE, Flower
+from .pagination import decode_cursor, keyset_page
+
+CATALOG_TIMEOUT = 5 * 60
+
+
+def _from_primary(compute):
+  def fill():
+    with use_primary():
+      return compute()
+  return fill
+
+
+def get_page(cursor=None, page_size=24):
+  """keyset_page() over the catalog: (flowers, next_cursor)."""
+  if decode_cursor(cursor) is None:
+    # Tampered cursors restart from the first page; don't key the cache on them.
+    cursor = None
+  key = versioned_key(CATALOG_CACHE, "page", page_size, cursor or "")
+  return cache.get_or_set(key, _from_primary(lambda: keyset_page(Flower.objects.for_catalog(), cursor, page_size = page_size)),
+                          CATALOG_TIMEOUT)
+
+
+def get_flower(flower_id):
+  """The flower (with its rating aggregates) for its product page; 404s if missing."""
+  key = versioned_key(CATALOG_CACHE, "flower", flower_id)
+  return cache.get_or_set(key, _from_primary(lambda: get_object_or_404(Flower, flower_id = flower_id)), CATALOG_TIMEOUT)
@@ -127,4 +127,31 @@ class CommentForm(ModelForm):
 
     class Meta:
         model = Comment
-        fields = ["body", "rating"]
\ No newline at end of file
+        fields = ["body", "rating"]
+
+class SearchForm(forms.Form):
+    q = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Search flowers or shops...'
+        })
+    )
+    min_price = forms.DecimalField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Min ₹'})
+    )
+    max_price = forms.DecimalField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Max ₹'})
+    )
+    min_rating = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=5,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Min rating'})
+    )
+    in_stock = forms.BooleanField(required=False, label='In stock only')
@@ -0,0 +1,91 @@
+"""Resized WebP/AVIF copies of Flower.img for responsive <picture> markup.
+
+Variants are written next to the original through the image field's storage
+(pics/rose.<hash>.jpg -> pics/rose-320w.<hash>.webp) and listed in Flower.img_variants as
+{"webp": [[320, "pics/rose-320w.webp"], ...], ...}, smallest first. The
+{% flower_picture %} tag turns that into srcset candidates and falls back to
+the original for flowers that have no variants.
+
+Uploads only queue the work (petalcart.tasks.build_image_variants), so the
+owner's request never waits on Pillow; `manage.py runworker --processes N`
+bounds how many images are encoded at once.
+"""
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from adaptlearn.storage import original_stem
+
+from .models import Flower
+
+ENCODERS = {
+  "avif" : {"format" : "AVIF", "quality" : 55},
+  "webp" : {"format" : "WEBP", "quality" : 80, "method" : 4},
+}
+
+
+def available_formats():
+  return [fmt for fmt in settings.FLOWER_IMAGE_FORMATS if fmt in ENCODERS and features.check(fmt)]
+
+
+def variant_name(name, width, fmt):
+  # The storage hashes the variant's own content into the final name.
+  return f"{original_stem(name)}-{width}w.{fmt}"
+
+
+def _has_alpha(image):
+  return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def generate_variants(field_file):
+  """Write every width x format variant of `field_file` and return the mapping.
+
+  Images are never upscaled: an original narrower than the smallest width
+  gets a single variant at its own width.
+  """
+  widths = sorted(settings.FLOWER_IMAGE_WIDTHS)
+  formats = available_formats()
+  storage = field_file.storage
+  variants = {fmt : [] for fmt in formats}
+  with storage.open(field_file.name, "rb") as source, Image.open(source) as image:
+    # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which is most of the
+    # cost for large photos; draft() keeps at least the largest width.
+    image.draft(None, (widths[-1], widths[-1]))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+    targets = [width for width in widths if width < image.width] or [image.width]
+    for width in targets:
+      height = max(1, round(image.height * width / image.width))
+      resized = image.resize((width, height), Image.LANCZOS)
+      for fmt in formats:
+        buffer = io.BytesIO()
+        resized.save(buffer, **ENCODERS[fmt])
+        name = storage.save(variant_name(field_file.name, width, fmt), ContentFile(buffer.getvalue()))
+        variants[fmt].append([width, name])
+  return variants
+
+
+def delete_variants(variants, storage):
+  for entries in variants.values():
+    for _width, name in entries:
+      storage.delete(name)
+
+
+def build_variants(flower):
+  """(Re)generate `flower`'s variants, store them and remove the previous set."""
+  previous = flower.img_variants or {}
+  variants = generate_variants(flower.img) if flower.img else {}
+  Flower.objects.filter(pk = flower.pk).bump_card_version(img_variants = variants)
+  flower.img_variants = variants
+  delete_variants(previous, flower.img.storage)
+  return variants
+
+
+def detach_variants(flower):
+  """Stop serving `flower`'s variants (e.g. the image was replaced) and return them for deletion."""
+  stale = flower.img_variants or {}
+  Flower.objects.filter(pk = flower.pk).bump_card_version(img_variants = {})
+  flower.img_variants = {}
+  return stale
@@ -0,0 +1,62 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from petalcart.models import Cart, CartItem, Flower, FlowerShop
+from petalcart.cart import empty_cart
+from petalcart.orders import place_order
+from shop import reservations
+from shop.models import Stock
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Report database round trips and time for cart checkout and payment capture "
+            "at several cart sizes. Runs inside a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,20,50',
+                            help="Comma-separated cart sizes to measure.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.stdout.write(f"{'lines':>6} {'checkout q':>11} {'capture q':>10} {'checkout ms':>12} {'capture ms':>11}")
+        for size in sizes:
+            try:
+                with transaction.atomic():
+                    self.stdout.write(self._measure(size))
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _measure(self, size):
+        user = User.objects.create_user(f"bench-checkout-{size}")
+        shop = FlowerShop.objects.create(shop_name="Bench shop", shop_address="-")
+        cart = Cart.objects.create(user=user)
+        for i in range(size):
+            flower = Flower.objects.create(shop=shop, flowername=f"Bench {i}", img="pics/bench.jpg",
+                                           desc="-", price=Decimal("10.00"))
+            Stock.objects.create(flower=flower, shop=shop, quantity=100)
+            CartItem.objects.create(cart=cart, flower=flower, quantity=2)
+
+        with CaptureQueriesContext(connection) as checkout:
+            started = time.perf_counter()
+            items = list(cart.items.select_related('flower__stock'))
+            order = place_order(user, [(item.flower, item.quantity) for item in items], Decimal("0"))
+            checkout_ms = (time.perf_counter() - started) * 1000
+
+        with CaptureQueriesContext(connection) as capture:
+            started = time.perf_counter()
+            reservations.commit(order)
+            empty_cart(user.id)
+            capture_ms = (time.perf_counter() - started) * 1000
+
+        return (f"{size:>6} {len(checkout.captured_queries):>11} {len(capture.captured_queries):>10} "
+                f"{checkout_ms:>12.1f} {capture_ms:>11.1f}")
@@ -0,0 +1,92 @@
+import itertools
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+
+
+_opened = itertools.count()
+
+
+def backend_id(conn):
+    """Identity of the server-side session behind a Django connection."""
+    raw = conn.connection
+    if conn.vendor == 'postgresql':
+        info = getattr(raw, 'info', None)  # psycopg 3
+        return info.backend_pid if info is not None else raw.get_backend_pid()
+    # Without a pool every connect opens a new session.
+    return next(_opened)
+
+
+class Command(BaseCommand):
+    help = ("Serve --requests requests from N concurrent worker threads through the full Django "
+            "stack and report how many database connections were checked out and opened per "
+            "request, for the current DB_POOL / DB_CONN_MAX_AGE / DB_PGBOUNCER settings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,4,16',
+                            help="Comma-separated worker (thread) counts to measure.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per worker.")
+        parser.add_argument('--path', default=None,
+                            help="Page to request as a signed-in user (default: the cart page).")
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('cart_display')
+        settings_dict = connection.settings_dict
+        self.stdout.write(f"{connection.vendor}: pool={bool(settings_dict['OPTIONS'].get('pool'))} "
+                          f"CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']} "
+                          f"health_checks={settings_dict['CONN_HEALTH_CHECKS']} path={path}")
+        self.stdout.write(f"{'workers':>7} {'requests':>9} {'checkouts':>10} {'sessions':>9} "
+                          f"{'sessions/req':>13} {'req/s':>8} {'errors':>7}")
+        # Signed in, so every request reads its session and user from the database.
+        user, _ = User.objects.get_or_create(username="bench-connections")
+        try:
+            for workers in [int(n) for n in options['workers'].split(',')]:
+                self.stdout.write(self._measure(workers, options['requests'], path, user))
+        finally:
+            user.delete()
+
+    def _measure(self, workers, per_worker, path, user):
+        lock = threading.Lock()
+        checkouts = [0]
+        sessions = set()
+        errors = [0]
+
+        def on_connect(sender, connection, **kwargs):
+            with lock:
+                checkouts[0] += 1
+                sessions.add(backend_id(connection))
+
+        def work():
+            client = Client()
+            client.force_login(user)
+            for _ in range(per_worker):
+                if client.get(path).status_code >= 500:
+                    with lock:
+                        errors[0] += 1
+                # The test client skips the request_finished cleanup that a
+                # real server runs, which is what recycles connections.
+                close_old_connections()
+            connections.close_all()
+
+        connections.close_all()
+        connection_created.connect(on_connect)
+        try:
+            threads = [threading.Thread(target=work) for _ in range(workers)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(on_connect)
+
+        total = workers * per_worker
+        return (f"{workers:>7} {total:>9} {checkouts[0]:>10} {len(sessions):>9} "
+                f"{len(sessions) / total:>13.3f} {total / elapsed:>8.0f} {errors[0]:>7}")
@@ -0,0 +1,106 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from adaptlearn.ids import uuid7
+
+# Each table mimics OrderItem's hot indexes: its primary key and a foreign
+# key to the parent order (itself keyed the same way).
+KINDS = {
+    "uuid4": uuid.uuid4,
+    "uuid7": uuid7,
+    "bigint": None,
+}
+
+
+def _ddl(kind, table):
+    if connection.vendor == 'postgresql':
+        if kind == "bigint":
+            return (f"CREATE TEMP TABLE {table} (id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY, "
+                    f"order_ref bigint NOT NULL, quantity integer NOT NULL)")
+        return f"CREATE TEMP TABLE {table} (id uuid PRIMARY KEY, order_ref uuid NOT NULL, quantity integer NOT NULL)"
+    if connection.vendor == 'sqlite':
+        if kind == "bigint":
+            return (f"CREATE TEMP TABLE {table} (id INTEGER PRIMARY KEY, "
+                    f"order_ref integer NOT NULL, quantity integer NOT NULL)")
+        # Django stores UUIDField as char(32) hex on SQLite.
+        return f"CREATE TEMP TABLE {table} (id char(32) PRIMARY KEY, order_ref char(32) NOT NULL, quantity integer NOT NULL)"
+    raise CommandError(f"bench_keys supports PostgreSQL and SQLite, not {connection.vendor}")
+
+
+def _value(key):
+    return key.hex if connection.vendor == 'sqlite' else key
+
+
+def _index_bytes(cursor, table):
+    """Total size of the table's indexes, or None if the database can't tell."""
+    if connection.vendor == 'postgresql':
+        cursor.execute("SELECT pg_indexes_size(%s::regclass)", [table])
+        return cursor.fetchone()[0]
+    try:
+        cursor.execute("SELECT COALESCE(SUM(pgsize), 0) FROM dbstat('temp') WHERE name IN "
+                       "(SELECT name FROM temp.sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                       [table])
+    except Exception:
+        return None  # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+    return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = ("Insert --rows order-item-shaped rows keyed by uuid4, uuid7 and bigint into temporary "
+            "tables and report insert throughput and index size for each key type.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--kinds', default=",".join(KINDS),
+                            help="Comma-separated key types to measure.")
+
+    def handle(self, *args, **options):
+        rows, batch_size, per_order = options['rows'], options['batch_size'], options['items_per_order']
+        kinds = [kind.strip() for kind in options['kinds'].split(',')]
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise CommandError(f"Unknown key types: {', '.join(sorted(unknown))}")
+
+        self.stdout.write(f"{'key':>7} {'rows':>11} {'seconds':>9} {'rows/s':>10} {'index MB':>9}")
+        for kind in kinds:
+            self.stdout.write(self._measure(kind, rows, batch_size, per_order))
+
+    def _measure(self, kind, rows, batch_size, per_order):
+        table = f"bench_keys_{kind}"
+        new_key = KINDS[kind]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(_ddl(kind, table))
+            cursor.execute(f"CREATE INDEX {table}_order_ref ON {table} (order_ref)")
+            if new_key is None:
+                sql = f"INSERT INTO {table} (order_ref, quantity) VALUES (%s, %s)"
+            else:
+                sql = f"INSERT INTO {table} (id, order_ref, quantity) VALUES (%s, %s, %s)"
+
+            # Only the INSERTs are timed, not generating the keys.
+            elapsed = 0.0
+            order_ref = None
+            for offset in range(0, rows, batch_size):
+                batch = []
+                for n in range(offset, min(offset + batch_size, rows)):
+                    if n % per_order == 0:
+                        # A new parent order, keyed like the items.
+                        order_ref = n // per_order if new_key is None else _value(new_key())
+                    if new_key is None:
+                        batch.append((order_ref, 1))
+                    else:
+                        batch.append((_value(new_key()), order_ref, 1))
+                started = time.perf_counter()
+                cursor.executemany(sql, batch)
+                elapsed += time.perf_counter() - started
+
+            size = _index_bytes(cursor, table)
+            cursor.execute(f"DROP TABLE {table}")
+
+        index_mb = f"{size / 1024 / 1024:>9.1f}" if size is not None else f"{'n/a':>9}"
+        return f"{kind:>7} {rows:>11} {elapsed:>9.1f} {rows / elapsed:>10.0f} {index_mb}"
@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from petalcart import search
+from petalcart.models import Flower, FlowerShop
+from shop.models import Stock
+
+COLOURS = ["red", "white", "yellow", "pink", "blue", "purple", "orange", "peach", "ivory", "crimson"]
+KINDS = ["rose", "tulip", "lily", "orchid", "daisy", "peony", "carnation", "sunflower", "iris", "dahlia"]
+WORDS = ["classic", "romantic", "fragrant", "seasonal", "wild", "garden", "bouquet", "stem", "bloom", "fresh"]
+
+# (label, search_flowers() keyword arguments)
+QUERIES = [
+    ("one word", {"query": "tulip"}),
+    ("two words", {"query": "red rose"}),
+    ("prefix", {"query": "orch"}),
+    ("shop name", {"query": "sunrise"}),
+    ("words + filters", {"query": "pink peony", "min_price": Decimal("20"), "max_price": Decimal("80"),
+                         "in_stock": True, "min_rating": 3}),
+    ("filters only", {"min_price": Decimal("20"), "in_stock": True}),
+    ("no match", {"query": "cactus"}),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Seed --flowers flowers and time /search/ queries against --target-ms. Runs inside a "
+            "transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flowers', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query.")
+        parser.add_argument('--target-ms', type=float, default=20.0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._seed(options['flowers'])
+                self._report(options['repeat'], options['target_ms'])
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            # Drop the seeded flowers from this process's index as well.
+            if connection.vendor != 'postgresql':
+                search.index.build()
+
+    def _seed(self, count):
+        rng = random.Random(0)
+        shops = FlowerShop.objects.bulk_create(
+            [FlowerShop(shop_name=name, shop_address="-")
+             for name in ("Sunrise Gardens", "Petal Lane", "Bloom Corner", "Stem & Co")])
+        flowers = []
+        for i in range(count):
+            colour, kind = rng.choice(COLOURS), rng.choice(KINDS)
+            ratings = rng.randint(0, 20)
+            rating_sum = sum(rng.randint(1, 5) for _ in range(ratings))
+            flowers.append(Flower(
+                shop=rng.choice(shops), flowername=f"{colour.title()} {kind.title()} {i}",
+                img="pics/bench.jpg", desc=" ".join(rng.sample(WORDS, 4)),
+                price=Decimal(rng.randint(5, 150)), rating_count=ratings, rating_sum=rating_sum,
+                avg_rating=rating_sum / ratings if ratings else 0))
+        Flower.objects.bulk_create(flowers, batch_size=5000)
+        Stock.objects.bulk_create(
+            [Stock(flower=flower, shop=flower.shop, quantity=rng.choice([0, 5, 50]))
+             for flower in flowers], batch_size=5000)
+
+        started = time.perf_counter()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE petalcart_flower")
+                cursor.execute("ANALYZE shop_stock")
+            what = "ANALYZE"
+        else:
+            search.index.build()
+            what = "in-process index build"
+        self.stdout.write(f"{connection.vendor}: {count} flowers, {what} "
+                          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def _report(self, repeat, target_ms):
+        self.stdout.write(f"{'query':<16} {'results':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        slow = 0
+        for label, kwargs in QUERIES:
+            results = search.search_flowers(**kwargs)  # warm-up
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                search.search_flowers(**kwargs)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            line = (f"{label:<16} {len(results):>8} {statistics.median(timings):>8.1f} "
+                    f"{p95:>8.1f} {timings[-1]:>8.1f}")
+            if p95 > target_ms:
+                slow += 1
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
+        self.stdout.write(f"{slow} of {len(QUERIES)} queries over the {target_ms:g} ms p95 target")
@@ -0,0 +1,97 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from jobs.queue import run_pending
+from petalcart.models import FlowerShop
+
+
+class _Rollback(Exception):
+    pass
+
+
+def run_now(handler, **payload):
+    """Stand-in for enqueue(): run the job inside the request, as before the queue."""
+    handler(**payload)
+
+
+def noise_jpeg(size_mb):
+    """A JPEG of roughly `size_mb` megabytes (random pixels barely compress)."""
+    pixels = int(size_mb * 1024 * 1024 / 1.2)
+    width = int((pixels * 4 / 3) ** 0.5)
+    height = pixels // width
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=95)
+    return buffer.getvalue(), (width, height)
+
+
+class Command(BaseCommand):
+    help = ("Time a flower image upload through the add_flower view: the request itself "
+            "(variants offloaded to the job queue), the variant job it no longer waits for, and "
+            "the request with the job run inline. Runs against a temporary MEDIA_ROOT inside a "
+            "transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=float, default=10)
+        parser.add_argument('--runs', type=int, default=3)
+
+    def handle(self, *args, **options):
+        data, (width, height) = noise_jpeg(options['size_mb'])
+        self.stdout.write(f"Upload: {len(data) / 1024 / 1024:.1f} MB JPEG, {width}x{height}")
+
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['*']):
+                try:
+                    with transaction.atomic():
+                        request_ms, job_ms, inline_ms = self._measure(data, options['runs'])
+                        raise _Rollback
+                except _Rollback:
+                    pass
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self.stdout.write(f"{'':<28} {'median ms':>10}")
+        self.stdout.write(f"{'request, offloaded':<28} {statistics.median(request_ms):>10.0f}")
+        self.stdout.write(f"{'variant job (worker)':<28} {statistics.median(job_ms):>10.0f}")
+        self.stdout.write(f"{'request, inline':<28} {statistics.median(inline_ms):>10.0f}")
+
+    def _measure(self, data, runs):
+        owner = User.objects.create_user("bench-upload")
+        FlowerShop.objects.create(shop_name="Bench shop", shop_address="-", owner=owner)
+        client = Client()
+        client.force_login(owner)
+
+        def upload(name):
+            started = time.perf_counter()
+            response = client.post(reverse("add_flower"), {
+                "flowername": name, "desc": "-", "price": "1.00",
+                "img": SimpleUploadedFile(f"{name}.jpg", data, content_type="image/jpeg"),
+            })
+            if response.status_code != 302:
+                raise RuntimeError(f"Upload was rejected (HTTP {response.status_code}).")
+            return (time.perf_counter() - started) * 1000
+
+        request_ms, job_ms, inline_ms = [], [], []
+        for run in range(runs):
+            request_ms.append(upload(f"bench-{run}"))
+            started = time.perf_counter()
+            run_pending()
+            job_ms.append((time.perf_counter() - started) * 1000)
+
+            with mock.patch("shop.views.enqueue", run_now):
+                inline_ms.append(upload(f"bench-inline-{run}"))
+        return request_ms, job_ms, inline_ms
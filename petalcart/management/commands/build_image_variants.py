@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from petalcart import images
+from petalcart.models import Flower
+
+
+def build(pk):
+    try:
+        images.build_variants(Flower.objects.get(pk=pk))
+        return pk, None
+    except Exception as exc:  # one bad file must not stop the backfill
+        return pk, exc
+
+
+def build_in_thread(pk):
+    try:
+        return build(pk)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Generate the resized WebP/AVIF variants of Flower.img for flowers that lack them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Images processed in parallel (Pillow releases the GIL while resizing and encoding).")
+        parser.add_argument('--force', action='store_true',
+                            help="Rebuild variants that already exist, e.g. after changing FLOWER_IMAGE_WIDTHS.")
+
+    def handle(self, *args, **options):
+        flowers = Flower.objects.exclude(img='')
+        if not options['force']:
+            flowers = flowers.filter(img_variants={})
+        pks = list(flowers.values_list('pk', flat=True))
+
+        if options['workers'] <= 1:
+            results = [build(pk) for pk in pks]
+        else:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                results = list(pool.map(build_in_thread, pks))
+
+        failed = [(pk, exc) for pk, exc in results if exc is not None]
+        for pk, exc in failed:
+            self.stderr.write(f"Flower {pk}: {exc!r}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Built image variants for {len(results) - len(failed)} flowers ({len(failed)} failed)."))
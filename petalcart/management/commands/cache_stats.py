@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from adaptlearn.cache import metrics
+
+
+class Command(BaseCommand):
+    help = "Show cache hit/miss counts per key namespace, summed over every process (adaptlearn.cache)."
+
+    def handle(self, *args, **options):
+        stats = metrics()
+        if not stats:
+            self.stdout.write("No cache metrics recorded yet.")
+            return
+        self.stdout.write(f"{'namespace':<36} {'L1 hit':>9} {'L1 miss':>9} {'L2 hit':>9} {'L2 miss':>9} {'hit %':>6}")
+        for namespace, counts in sorted(stats.items()):
+            lookups = counts["l1_hit"] + counts["l1_miss"]
+            hits = counts["l1_hit"] + counts["l2_hit"]
+            rate = 100 * hits / lookups if lookups else 0
+            self.stdout.write(f"{namespace:<36} {counts['l1_hit']:>9} {counts['l1_miss']:>9} "
+                              f"{counts['l2_hit']:>9} {counts['l2_miss']:>9} {rate:>5.1f}%")
@@ -0,0 +1,94 @@
+import json
+import re
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from petalcart.models import Cart, CartItem, Comment, Flower, FlowerShop, Order, OrderItem
+from shop.models import Stock
+
+# SQLite's EXPLAIN QUERY PLAN says "SCAN <table>" for a full table scan and
+# "SCAN <table> USING [COVERING] INDEX ..." / "SEARCH ..." otherwise.
+SQLITE_SCAN = re.compile(r"\bSCAN (\w+)(?!.*\bUSING\b)")
+
+
+def _sample(model, field):
+    return model.objects.values_list(field, flat=True).first()
+
+
+def hot_queries():
+    """(label, queryset) for the filters the busiest pages run, with sample arguments."""
+    user_id = _sample(User, 'pk') or 0
+    flower_id = _sample(Flower, 'pk') or uuid.uuid4()
+    shop_id = _sample(FlowerShop, 'pk') or uuid.uuid4()
+    cart_id = _sample(Cart, 'pk') or uuid.uuid4()
+    return [
+        ("catalog page", Flower.objects.order_by('-created', '-flower_id')[:25]),
+        ("latest comment of a flower", Comment.objects.filter(flower_id=flower_id).order_by('-created')[:1]),
+        ("buyer order history", Order.objects.filter(user_id=user_id).order_by('-created', '-order_id')[:6]),
+        ("order by Razorpay id", Order.objects.filter(razorpay_order_id="order_sample")),
+        ("orders by status", Order.objects.filter(status="Pending")),
+        ("shop order items", OrderItem.objects.filter(shop_id=shop_id).order_by('-created', '-id')[:51]),
+        ("shop stock", Stock.objects.filter(shop_id=shop_id)),
+        ("user cart", Cart.objects.filter(user_id=user_id)),
+        ("cart line", CartItem.objects.filter(cart_id=cart_id, flower_id=flower_id)),
+    ]
+
+
+def table_rows(table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        else:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+        row = cursor.fetchone()
+    return max(row[0], 0) if row else 0
+
+
+def sequential_scans(queryset):
+    """(plan text, [tables read by a full scan]) for `queryset`."""
+    if connection.vendor == 'postgresql':
+        plan = queryset.explain(format='json')
+        tables = []
+        nodes = [json.loads(plan)[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node.get('Node Type') == 'Seq Scan':
+                tables.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return plan, tables
+    plan = queryset.explain()
+    if connection.vendor == 'sqlite':
+        return plan, SQLITE_SCAN.findall(plan)
+    return plan, []
+
+
+class Command(BaseCommand):
+    help = ("EXPLAIN the hot catalog, cart, order and shop queries and report sequential scans "
+            "over tables larger than --min-rows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help="Ignore full scans of tables smaller than this (the planner prefers them).")
+        parser.add_argument('--plans', action='store_true', help="Print every query plan.")
+        parser.add_argument('--fail', action='store_true',
+                            help="Exit with an error if any sequential scan is reported (for CI).")
+
+    def handle(self, *args, **options):
+        min_rows = options['min_rows']
+        problems = 0
+        for label, queryset in hot_queries():
+            plan, tables = sequential_scans(queryset)
+            large = [(table, rows) for table in tables if (rows := table_rows(table)) >= min_rows]
+            if large:
+                problems += 1
+                scans = ", ".join(f"{table} (~{rows} rows)" for table, rows in large)
+                self.stdout.write(self.style.WARNING(f"SEQ SCAN  {label}: {scans}"))
+            else:
+                self.stdout.write(f"ok        {label}")
+            if options['plans']:
+                self.stdout.write(plan + "\n")
+        if problems and options['fail']:
+            raise CommandError(f"{problems} hot queries use sequential scans")
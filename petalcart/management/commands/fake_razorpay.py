@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class FakeRazorpayHandler(BaseHTTPRequestHandler):
+    """Just enough of the Razorpay Orders API for checkout and load tests."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    latency = 0.0
+    orders = {}
+    orders_lock = threading.Lock()
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/orders":
+            return self._reply(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "Not found"}})
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+            amount = int(data["amount"])
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {"error": {"code": "BAD_REQUEST_ERROR", "description": "amount is required"}})
+
+        time.sleep(self.latency)
+        order = {
+            "id": f"order_{uuid.uuid4().hex[:14]}",
+            "entity": "order",
+            "amount": amount,
+            "amount_paid": 0,
+            "amount_due": amount,
+            "currency": data.get("currency", "INR"),
+            "receipt": data.get("receipt"),
+            "status": "created",
+            "attempts": 0,
+            "created_at": int(time.time()),
+        }
+        with self.orders_lock:
+            self.orders[order["id"]] = order
+        self._reply(200, order)
+
+    def do_GET(self):
+        order_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+        with self.orders_lock:
+            order = self.orders.get(order_id)
+        if order is None:
+            return self._reply(404, {"error": {"code": "BAD_REQUEST_ERROR", "description": "Order not found"}})
+        self._reply(200, order)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timed out) first
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=0, latency_ms=0):
+    handler = type("Handler", (FakeRazorpayHandler,), {"latency": latency_ms / 1000, "orders": {}})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+class Command(BaseCommand):
+    help = ("Run a local stand-in for the Razorpay Orders API. "
+            "Set RAZORPAY_BASE_URL=http://HOST:PORT to send checkout traffic to it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=int, default=0,
+                            help="Delay added to every order creation, to mimic a slow gateway.")
+
+    def handle(self, *args, **options):
+        server = make_server(options['host'], options['port'], options['latency_ms'])
+        host, port = server.server_address[:2]
+        self.stdout.write(f"Fake Razorpay listening on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
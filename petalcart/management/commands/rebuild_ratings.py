@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from adaptlearn.cache import bump_namespace
+from petalcart.models import CATALOG_CACHE, Flower
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating_count/rating_sum/avg_rating on every Flower from its comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        flowers = (Flower.objects
+                   .annotate(n=Count('comments'), total=Sum('comments__rating'))
+                   .only('flower_id', 'rating_count', 'rating_sum', 'avg_rating')
+                   .order_by('flower_id'))
+
+        updated = 0
+        batch = []
+        for flower in flowers.iterator(chunk_size=batch_size):
+            flower.rating_count = flower.n
+            flower.rating_sum = flower.total or 0
+            flower.avg_rating = flower.rating_sum / flower.n if flower.n else 0
+            batch.append(flower)
+            if len(batch) >= batch_size:
+                updated += self._flush(batch)
+        updated += self._flush(batch)
+
+        # bulk_update() sends no signals: drop cached product pages by hand.
+        bump_namespace(CATALOG_CACHE)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {updated} flowers."))
+
+    def _flush(self, batch):
+        count = len(batch)
+        if batch:
+            with transaction.atomic():
+                Flower.objects.bulk_update(batch, ['rating_count', 'rating_sum', 'avg_rating'])
+            batch.clear()
+        return count
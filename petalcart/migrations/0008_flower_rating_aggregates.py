@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:11
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Flower = apps.get_model('petalcart', 'Flower')
+    flowers = Flower.objects.annotate(n=Count('comments'), total=Sum('comments__rating'))
+    for flower in flowers.filter(n__gt=0):
+        flower.rating_count = flower.n
+        flower.rating_sum = flower.total or 0
+        flower.avg_rating = flower.rating_sum / flower.n
+        flower.save(update_fields=['rating_count', 'rating_sum', 'avg_rating'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0007_order_razorpay_order_id_order_razorpay_payment_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flower',
+            name='avg_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='flower',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='flower',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0008_flower_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flower',
+            index=models.Index(fields=['-created', '-flower_id'], name='flower_catalog_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# The tsvector expression must match petalcart.search.DOCUMENT_SQL exactly.
+CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS flower_search_document_idx ON petalcart_flower USING gin ("
+    "to_tsvector('english'::regconfig, "
+    "coalesce(\"petalcart_flower\".\"flowername\", '') || ' ' || "
+    "coalesce(\"petalcart_flower\".\"desc\", '')))",
+    "CREATE INDEX IF NOT EXISTS flower_name_trgm_idx ON petalcart_flower "
+    "USING gin (flowername gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS flowershop_name_trgm_idx ON petalcart_flowershop "
+    "USING gin (shop_name gin_trgm_ops)",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS flower_search_document_idx",
+    "DROP INDEX IF EXISTS flower_name_trgm_idx",
+    "DROP INDEX IF EXISTS flowershop_name_trgm_idx",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0009_flower_catalog_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(CREATE_SQL), run_on_postgres(DROP_SQL)),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0010_flower_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True)),
+                ('event', models.CharField(max_length=50)),
+                ('payment_id', models.CharField(blank=True, db_index=True, max_length=200)),
+                ('razorpay_order_id', models.CharField(blank=True, max_length=200)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('Received', 'Received'), ('Processed', 'Processed'), ('Failed', 'Failed')], default='Received', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('received', models.DateTimeField(auto_now_add=True)),
+                ('processed', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='razorpay_order_id',
+            field=models.CharField(blank=True, db_index=True, max_length=200, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_shop_and_created(apps, schema_editor):
+    OrderItem = apps.get_model('petalcart', 'OrderItem')
+    Flower = apps.get_model('petalcart', 'Flower')
+    Order = apps.get_model('petalcart', 'Order')
+    OrderItem.objects.update(
+        shop=Subquery(Flower.objects.filter(pk=OuterRef('flower_id')).values('shop_id')[:1]),
+        created=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('created')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0011_payment_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='petalcart.flowershop'),
+        ),
+        migrations.RunPython(backfill_shop_and_created, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['shop', '-created', '-id'], name='orderitem_shop_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0013_order_rolled_up'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flower',
+            name='img_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='flower',
+            name='avg_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='flower',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='flower',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0014_flower_img_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flower',
+            name='card_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Make room for the cart unique constraints added in 0018.
+
+    A user's extra carts are folded into their oldest one, and repeated
+    flower lines within a cart are folded into one line whose quantity is
+    the sum.
+    """
+    Cart = apps.get_model('petalcart', 'Cart')
+    CartItem = apps.get_model('petalcart', 'CartItem')
+
+    duplicated_users = (Cart.objects.values('user_id').annotate(n=Count('pk'))
+                        .filter(n__gt=1).values_list('user_id', flat=True))
+    for user_id in list(duplicated_users):
+        keep, *extra = Cart.objects.filter(user_id=user_id).order_by('created', 'pk')
+        CartItem.objects.filter(cart__in=extra).update(cart=keep)
+        Cart.objects.filter(pk__in=[cart.pk for cart in extra]).delete()
+
+    duplicated_lines = (CartItem.objects.values('cart_id', 'flower_id')
+                        .annotate(n=Count('pk'), total=Sum('quantity')).filter(n__gt=1))
+    for line in list(duplicated_lines):
+        lines = CartItem.objects.filter(cart_id=line['cart_id'], flower_id=line['flower_id']).order_by('pk')
+        keep = lines.first()
+        lines.exclude(pk=keep.pk).delete()
+        CartItem.objects.filter(pk=keep.pk).update(quantity=line['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0016_order_history_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+    ]
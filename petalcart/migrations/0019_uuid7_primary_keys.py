@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:55
+
+import adaptlearn.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0018_cart_constraints_and_indexes'),
+    ]
+
+    # Only the Python-side default changes: existing uuid4 keys stay, new rows
+    # get time-ordered uuid7 keys. Nothing to do in the database.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='cart',
+                name='cart_id',
+                field=models.UUIDField(default=adaptlearn.ids.uuid7, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='comment',
+                name='comment_id',
+                field=models.UUIDField(default=adaptlearn.ids.uuid7, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='flower',
+                name='flower_id',
+                field=models.UUIDField(default=adaptlearn.ids.uuid7, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='flowershop',
+                name='shop_id',
+                field=models.UUIDField(default=adaptlearn.ids.uuid7, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='order',
+                name='order_id',
+                field=models.UUIDField(default=adaptlearn.ids.uuid7, editable=False, primary_key=True, serialize=False),
+            ),
+        ]),
+    ]
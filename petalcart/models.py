@@ -1,11 +1,17 @@
 from django.db import models
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.crypto import get_random_string
-import uuid
+import secrets
+
+from adaptlearn.cache import bump_namespace
+from adaptlearn.ids import uuid7
 # Create your models here.
 
 class FlowerShop(models.Model):
-  shop_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+  shop_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
   shop_name = models.CharField(max_length=255)
   shop_address = models.CharField(max_length=255)
   owner = models.OneToOneField(User, on_delete=models.CASCADE,
@@ -13,23 +19,84 @@ class FlowerShop(models.Model):
   def __str__(self):
     return self.shop_name
   
+# Cache namespace of catalog pages (petalcart.catalog).
+CATALOG_CACHE = "catalog"
+
+
+def new_card_version():
+  return secrets.randbelow(2 ** 31)
+
+
+class FlowerQuerySet(models.QuerySet):
+  def bump_card_version(self, **fields):
+    """Retire the cached catalog cards (flower_card.html) and pages showing these
+    flowers, updating `fields` in the same statement."""
+    updated = self.update(card_version = new_card_version(), **fields)
+    bump_namespace(CATALOG_CACHE)
+    return updated
+
+  def for_catalog(self):
+    # Everything a catalog card touches, batch-loaded: stock badge, owner
+    # links and the latest comment, so a page costs the same for any size.
+    # Pages are cached (petalcart.catalog), so user password hashes stay out.
+    latest_comment = Comment.objects.select_related('user').defer('user__password').order_by('-created')[:1]
+    return self.select_related('stock', 'shop__owner').defer('shop__owner__password').prefetch_related(
+        models.Prefetch('comments', queryset=latest_comment, to_attr='latest_comments'))
+
+
 class Flower(models.Model):
   shop = models.ForeignKey(FlowerShop, on_delete=models.CASCADE,
                           related_name='flowers',null=True,blank = True) 
   # Allows existing flowers to remain if you don't have shop data yeblank=True
-  flower_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+  flower_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
   flowername = models.CharField(max_length=100) 
   img = models.ImageField(upload_to='pics/')
+  # Resized WebP/AVIF copies of img, written by petalcart.images.
+  img_variants = models.JSONField(default=dict, blank=True, editable=False)
   desc = models.TextField()
   price = models.DecimalField(max_digits=10, decimal_places=2)
   updated = models.DateTimeField(auto_now=True)
   created = models.DateTimeField(auto_now_add=True)
+  # Denormalized from Comment so the catalog never aggregates per card.
+  # Kept in step by the comment views, rebuilt by `manage.py rebuild_ratings`.
+  rating_count = models.PositiveIntegerField(default=0, editable=False)
+  rating_sum = models.IntegerField(default=0, editable=False)
+  avg_rating = models.FloatField(default=0, editable=False)
+  # Part of the cache key of the flower's catalog card. Replaced whenever the
+  # flower, its stock or its comments change (petalcart/shop signals); a
+  # random stamp, so a stale instance saved late can't reuse a live key.
+  card_version = models.PositiveIntegerField(default=0, editable=False)
+
+  objects = FlowerQuerySet.as_manager()
+
+  class Meta:
+    indexes = [
+      # Catalog keyset: newest first, flower_id breaks ties.
+      models.Index(fields=['-created', '-flower_id'], name='flower_catalog_idx'),
+    ]
 
   def __str__(self):
       return self.flowername
 
+  @property
+  def rating_stars(self):
+      return round(self.avg_rating)
+
+  def adjust_rating(self, count_delta, sum_delta):
+      # F() keeps concurrent comment writes from losing updates; the average
+      # is derived in a second statement from the values the first one wrote.
+      flowers = Flower.objects.filter(flower_id=self.flower_id)
+      flowers.update(rating_count=F('rating_count') + count_delta,
+                     rating_sum=F('rating_sum') + sum_delta)
+      flowers.update(avg_rating=Case(
+          When(rating_count=0, then=Value(0.0)),
+          default=Cast('rating_sum', FloatField()) / F('rating_count'),
+          output_field=FloatField(),
+      ))
+      self.refresh_from_db(fields=['rating_count', 'rating_sum', 'avg_rating'])
+
 class Comment(models.Model):
-    comment_id = models.UUIDField(primary_key = True,default = uuid.uuid4,editable= False)
+    comment_id = models.UUIDField(primary_key = True,default = uuid7,editable= False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     body = models.TextField()
     # Adding related_name allows flower.comments.all()
@@ -42,20 +109,38 @@ class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     rating = models.IntegerField(default = 0)
 
+    class Meta:
+        indexes = [
+            # Latest comments of a flower (catalog cards, comment pages).
+            models.Index(fields = ['flower', '-created'], name = 'comment_flower_created_idx'),
+        ]
+
     def __str__(self):
         # FIX: Changed self.flower.name to self.flower.flowername
         return f'Comment by {self.user.username} on {self.flower.flowername}'
     
 class Cart(models.Model):
-   cart_id = models.UUIDField(primary_key = True, default = uuid.uuid4,editable=False)
+   cart_id = models.UUIDField(primary_key = True, default = uuid7,editable=False)
    user = models.ForeignKey(User,on_delete=models.CASCADE)
    created = models.DateTimeField(auto_now_add=True)
 
+   class Meta:
+      constraints = [
+         # Looked up with get_or_create(user=...): one cart per user.
+         models.UniqueConstraint(fields = ['user'], name = 'cart_one_per_user'),
+      ]
+
 class CartItem(models.Model):
    cart = models.ForeignKey(Cart, on_delete = models.CASCADE, related_name = "items")
    flower = models.ForeignKey(Flower,on_delete = models.CASCADE)
    quantity = models.PositiveIntegerField(default = 1)
 
+   class Meta:
+      constraints = [
+         # One line per flower; adding again raises its quantity.
+         models.UniqueConstraint(fields = ['cart', 'flower'], name = 'cartitem_one_per_flower'),
+      ]
+
 class Order(models.Model):
    STATUS_CHOICES = [
         ('Pending', 'Pending'),      
@@ -65,17 +150,62 @@ class Order(models.Model):
         ('Cancelled', 'Cancelled'),
         ('Paid','Paid')  
     ]
-   order_id = models.UUIDField(primary_key = True,default = uuid.uuid4,editable = False)
+   order_id = models.UUIDField(primary_key = True,default = uuid7,editable = False)
    user = models.ForeignKey(User,on_delete = models.CASCADE)
    total = models.DecimalField(max_digits= 10,decimal_places= 2)
    status = models.CharField(max_length= 20,default = "Pending")
    created = models.DateTimeField(auto_now_add = True)
 
-   razorpay_order_id = models.CharField(max_length = 200, blank = True,null = True)
+   razorpay_order_id = models.CharField(max_length = 200, blank = True,null = True, db_index = True)
    razorpay_payment_id = models.CharField(max_length = 200, blank = True,null = True)
+   # Whether the items are currently counted in shop.ShopDailySales.
+   rolled_up = models.BooleanField(default = False)
+
+   class Meta:
+      indexes = [
+         # A buyer's history, newest first (keyset on created, order_id).
+         models.Index(fields = ['user', '-created', '-order_id'], name = 'order_history_idx'),
+         # Status filters (shop dashboards, sales rollup).
+         models.Index(fields = ['status'], name = 'order_status_idx'),
+      ]
 
 class OrderItem(models.Model):
    order = models.ForeignKey(Order, on_delete = models.CASCADE)
    flower = models.ForeignKey(Flower, on_delete = models.CASCADE)
    quantity = models.PositiveBigIntegerField()
-   price = models.DecimalField(max_digits=10,decimal_places=2)
\ No newline at end of file
+   price = models.DecimalField(max_digits=10,decimal_places=2)
+   # Copies of flower.shop and order.created, so a shop's sales can be
+   # listed and totalled from one index without joining flower and order.
+   shop = models.ForeignKey(FlowerShop, on_delete = models.CASCADE, null = True, blank = True,
+                            related_name = "order_items")
+   created = models.DateTimeField(default = timezone.now)
+
+   class Meta:
+      indexes = [
+         models.Index(fields = ['shop', '-created', '-id'], name = 'orderitem_shop_created_idx'),
+      ]
+
+
+class PaymentEvent(models.Model):
+   # One row per Razorpay webhook delivery; the unique event_id is what
+   # makes replays and concurrent retries of the same event no-ops.
+   RECEIVED = 'Received'
+   PROCESSED = 'Processed'
+   FAILED = 'Failed'
+   STATUS_CHOICES = [
+      (RECEIVED, 'Received'),
+      (PROCESSED, 'Processed'),
+      (FAILED, 'Failed'),
+   ]
+   event_id = models.CharField(max_length = 100, unique = True)
+   event = models.CharField(max_length = 50)
+   payment_id = models.CharField(max_length = 200, blank = True, db_index = True)
+   razorpay_order_id = models.CharField(max_length = 200, blank = True)
+   payload = models.JSONField()
+   status = models.CharField(max_length = 10, choices = STATUS_CHOICES, default = RECEIVED)
+   error = models.TextField(blank = True)
+   received = models.DateTimeField(auto_now_add = True)
+   processed = models.DateTimeField(null = True, blank = True)
+
+   def __str__(self):
+      return f"{self.event} {self.event_id} ({self.status})"
@@ -0,0 +1,23 @@
+from django.db import transaction
+
+from shop import reservations
+from .models import Order, OrderItem
+
+
+def place_order(user, lines, total, hold = True):
+  """Create a Pending order for `lines` ([(flower, quantity), ...]) and take its stock.
+
+  The order, all of its items and the stock reservation go out as one
+  INSERT, one bulk INSERT and one conditional UPDATE (+ one bulk INSERT
+  for the reservations), whatever the number of lines. Raises
+  reservations.InsufficientStock and creates nothing if stock is short.
+  """
+  with transaction.atomic():
+    order = Order.objects.create(user = user, total = total, status = "Pending")
+    OrderItem.objects.bulk_create([
+      OrderItem(order = order, flower = flower, quantity = quantity, price = flower.price,
+                shop_id = flower.shop_id, created = order.created)
+      for flower, quantity in lines
+    ])
+    reservations.reserve(order, lines, hold = hold)
+  return order
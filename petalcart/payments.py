@@ -0,0 +1,167 @@
+"""Razorpay gateway access.
+
+One Client per process, over a requests Session whose connection pool is
+reused across requests (HTTP keep-alive) instead of a fresh client and TLS
+handshake per checkout. Every call is bounded by RAZORPAY_TIMEOUT. Failures
+to connect are retried with exponential backoff; order creation is a POST,
+so it is never retried once the request may have reached Razorpay.
+
+Payment confirmation arrives either from the browser (payment_sucess) or
+server-to-server (razorpay_webhook); both end in capture_order(), which is
+idempotent, so replays and races between the two never apply stock twice.
+"""
+import hashlib
+import hmac
+import logging
+import threading
+
+import razorpay
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from jobs.queue import enqueue
+from shop import reservations
+from shop.tasks import roll_up_order
+from .cart import empty_cart
+from .models import Order, PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class GatewayError(Exception):
+    """Razorpay could not be reached or refused the request."""
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+def reset_client():
+    """Drop the shared client, e.g. after changing RAZORPAY_* settings in tests."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
+
+
+def _build_client():
+    retry = Retry(
+        total=settings.RAZORPAY_MAX_RETRIES,
+        connect=settings.RAZORPAY_MAX_RETRIES,
+        # read/status retries only apply to idempotent methods (not POST).
+        read=settings.RAZORPAY_MAX_RETRIES,
+        status=settings.RAZORPAY_MAX_RETRIES,
+        status_forcelist=(429, 500, 502, 503, 504),
+        backoff_factor=settings.RAZORPAY_BACKOFF,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.RAZORPAY_POOL_SIZE,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    options = {}
+    if settings.RAZORPAY_BASE_URL:
+        options['base_url'] = settings.RAZORPAY_BASE_URL
+    return razorpay.Client(session=session,
+                           auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+                           **options)
+
+
+def create_order(amount_in_paise, receipt=None, currency="INR"):
+    data = {
+        "amount": amount_in_paise,
+        "currency": currency,
+        "payment_capture": 1,
+    }
+    if receipt:
+        data["receipt"] = receipt
+    try:
+        return get_client().order.create(data, timeout=settings.RAZORPAY_TIMEOUT)
+    except (requests.RequestException, razorpay.errors.BadRequestError,
+            razorpay.errors.GatewayError, razorpay.errors.ServerError, ValueError) as exc:
+        raise GatewayError(str(exc) or exc.__class__.__name__) from exc
+
+
+# For async views under ASGI: runs the pooled, blocking call in a worker
+# thread so the event loop is never blocked on Razorpay.
+acreate_order = sync_to_async(create_order, thread_sensitive=False)
+
+
+def signature_matches(secret, message, signature):
+    if not secret or not isinstance(signature, str) or not signature:
+        return False
+    if isinstance(message, str):
+        message = message.encode()
+    expected = hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+def capture_order(razorpay_order_id, payment_id):
+    """Mark the order paid, commit its stock hold and empty the buyer's cart.
+
+    The order row is locked for the duration. Only a Pending order without
+    a payment id is captured; any other order (already Paid, or since moved
+    on to Accepted, Shipped, ...) is returned untouched, so the browser
+    callback and each webhook event can all arrive, in any order. Raises
+    Order.DoesNotExist and reservations.InsufficientStock.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(razorpay_order_id=razorpay_order_id)
+        if order.razorpay_payment_id or order.status != "Pending":
+            return order
+        reservations.commit(order)
+        empty_cart(order.user_id)
+        order.razorpay_payment_id = payment_id
+        order.status = "Paid"
+        order.save(update_fields=["razorpay_payment_id", "status"])
+        enqueue(roll_up_order, order_id=str(order.order_id))
+    return order
+
+
+CAPTURE_EVENTS = {"payment.captured", "order.paid"}
+
+
+def record_event(event_id, body):
+    """Store a verified webhook delivery. Returns None if it was seen before."""
+    entity = body.get("payload", {}).get("payment", {}).get("entity", {})
+    try:
+        with transaction.atomic():
+            return PaymentEvent.objects.create(
+                event_id=event_id,
+                event=body.get("event", ""),
+                payment_id=entity.get("id", ""),
+                razorpay_order_id=entity.get("order_id") or "",
+                payload=body,
+            )
+    except IntegrityError:
+        return None
+
+
+def process_event(pk):
+    event = PaymentEvent.objects.get(pk=pk)
+    if event.status == PaymentEvent.PROCESSED:
+        return
+    try:
+        if event.event in CAPTURE_EVENTS and event.razorpay_order_id:
+            capture_order(event.razorpay_order_id, event.payment_id)
+    except (Order.DoesNotExist, reservations.InsufficientStock) as exc:
+        logger.warning("Payment event %s could not be applied: %r", event.event_id, exc)
+        PaymentEvent.objects.filter(pk=pk).update(status=PaymentEvent.FAILED, error=repr(exc),
+                                                  processed=timezone.now())
+        return
+    PaymentEvent.objects.filter(pk=pk).update(status=PaymentEvent.PROCESSED, processed=timezone.now())
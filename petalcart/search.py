@@ -0,0 +1,230 @@
+"""Catalog search over flower name, description and shop name.
+
+On PostgreSQL the match runs against a GIN-indexed tsvector expression, with
+a pg_trgm similarity fallback for misspelt queries (see migration 0010).
+Other databases use an in-process inverted index that is built on first use
+and kept current by the Flower/FlowerShop signals in petalcart.signals. That
+index is per process: a committed write bumps the shared "search" cache
+namespace, and every other process rebuilds its index on its next search
+after seeing the new version (within the cache's L1_TIMEOUT).
+"""
+import bisect
+import heapq
+import itertools
+import re
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from adaptlearn.cache import bump_namespace, namespace_version
+
+from .models import Flower
+
+SEARCH_CACHE = "search"
+
+# Must stay byte-for-byte identical to the expression indexed in migration
+# 0010, otherwise PostgreSQL will not use the index.
+DOCUMENT_SQL = ("to_tsvector('english'::regconfig, "
+                "coalesce(\"petalcart_flower\".\"flowername\", '') || ' ' || "
+                "coalesce(\"petalcart_flower\".\"desc\", ''))")
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Matching ids are checked against the filters this many at a time,
+# newest first, until a page is found.
+FILTER_CHUNK = 500
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+KEY_MASK = (1 << 128) - 1
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class InvertedIndex:
+    # Flowers are keyed by flower_id.int, and ordered by one int packing
+    # (created, key): ints hash and compare in C, while UUIDs and tuples of
+    # datetimes do it in Python, which dominates at tens of thousands of ids.
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(set)
+        self._terms_by_flower = {}
+        self._sort_keys = {}
+        self._order = []  # sort keys ascending: the catalog order, reversed
+        self._sorted_terms = []
+        self._built = False
+        self._version = None  # the SEARCH_CACHE version this index reflects
+
+    def build(self, version=None):
+        # The version is read before the rows, so a write committed meanwhile
+        # leaves the index behind the version and triggers another build.
+        if version is None:
+            version = namespace_version(SEARCH_CACHE)
+        rows = Flower.objects.values_list('flower_id', 'created', 'flowername', 'desc', 'shop__shop_name')
+        with self._lock:
+            self._postings.clear()
+            self._terms_by_flower.clear()
+            self._sort_keys.clear()
+            for flower_id, created, *fields in rows.iterator():
+                self._add(flower_id.int, created, fields)
+            self._order = sorted(self._sort_keys.values())
+            self._sorted_terms = sorted(self._postings)
+            self._built = True
+            self._version = version
+
+    def update(self, flower_id, created, *fields):
+        with self._lock:
+            if not self._built:
+                return
+            emptied = self._remove(flower_id.int)
+            added = self._add(flower_id.int, created, fields)
+            bisect.insort(self._order, self._sort_keys[flower_id.int])
+            self._retire_terms(emptied - added)
+            for term in added - emptied:
+                bisect.insort(self._sorted_terms, term)
+
+    def remove(self, flower_id):
+        with self._lock:
+            if self._built:
+                self._retire_terms(self._remove(flower_id.int))
+
+    def publish(self):
+        """Have the other processes rebuild once the current transaction
+        commits; call after this process's update()/remove() calls."""
+        transaction.on_commit(self._bump_version)
+
+    def search(self, query, limit=None):
+        """flower_id.int of the (first `limit`) flowers matching every token of
+        `query` as a word prefix, newest first."""
+        version = namespace_version(SEARCH_CACHE)
+        if not self._built or version != self._version:
+            self.build(version)
+        tokens = tokenize(query)
+        with self._lock:
+            matches = None
+            for token in tokens:
+                start = bisect.bisect_left(self._sorted_terms, token)
+                postings = []
+                for term in self._sorted_terms[start:]:
+                    if not term.startswith(token):
+                        break
+                    postings.append(self._postings[term])
+                # Read-only from here, so a single posting set needs no copy.
+                keys = postings[0] if len(postings) == 1 else set().union(*postings)
+                matches = keys if matches is None else matches & keys
+                if not matches:
+                    return []
+            if not matches:
+                return []
+            if len(matches) * 8 < len(self._order):
+                if limit is not None:
+                    return heapq.nlargest(limit, matches, key=self._sort_keys.__getitem__)
+                return sorted(matches, key=self._sort_keys.__getitem__, reverse=True)
+            # A good part of the catalog matches: walking the catalog order
+            # finds them sooner than sorting them.
+            ranked = (sort_key & KEY_MASK for sort_key in reversed(self._order))
+            return list(itertools.islice((key for key in ranked if key in matches), limit))
+
+    def _add(self, key, created, fields):
+        """Index a flower; returns the terms it is the first to use."""
+        terms = {term for field in fields for term in tokenize(field)}
+        self._terms_by_flower[key] = terms
+        self._sort_keys[key] = ((created - EPOCH) // MICROSECOND) << 128 | key
+        new_terms = set()
+        for term in terms:
+            if term not in self._postings:
+                new_terms.add(term)
+            self._postings[term].add(key)
+        return new_terms
+
+    def _remove(self, key):
+        """Unindex a flower; returns the terms it was the last to use."""
+        sort_key = self._sort_keys.pop(key, None)
+        if sort_key is not None:
+            del self._order[bisect.bisect_left(self._order, sort_key)]
+        emptied = set()
+        for term in self._terms_by_flower.pop(key, ()):
+            postings = self._postings[term]
+            postings.discard(key)
+            if not postings:
+                del self._postings[term]
+                emptied.add(term)
+        return emptied
+
+    def _retire_terms(self, terms):
+        for term in terms:
+            del self._sorted_terms[bisect.bisect_left(self._sorted_terms, term)]
+
+    def _bump_version(self):
+        version = bump_namespace(SEARCH_CACHE)
+        with self._lock:
+            # Only this process wrote since the index was last current.
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+
+
+index = InvertedIndex()
+
+
+def search_flowers(query="", min_price=None, max_price=None, in_stock=False, min_rating=None, limit=48):
+    flowers = Flower.objects.for_catalog()
+    if min_price is not None:
+        flowers = flowers.filter(price__gte=min_price)
+    if max_price is not None:
+        flowers = flowers.filter(price__lte=max_price)
+    if in_stock:
+        flowers = flowers.filter(stock__quantity__gt=0)
+    if min_rating:
+        flowers = flowers.filter(avg_rating__gte=min_rating)
+    filtered = min_price is not None or max_price is not None or in_stock or bool(min_rating)
+
+    if not query:
+        return list(flowers.order_by('-created', '-flower_id')[:limit])
+    if connection.vendor == 'postgresql':
+        return _postgres_search(flowers, query, limit)
+    # The index already knows the catalog order, so the database is only
+    # asked for rows by primary key (and to apply the filters, if any). With
+    # an ORDER BY, SQLite walks flower_catalog_idx and tests every row
+    # against the IN list instead.
+    if not filtered:
+        page = [uuid.UUID(int=key) for key in index.search(query, limit)]
+    else:
+        page = []
+        ranked = index.search(query)
+        for start in range(0, len(ranked), FILTER_CHUNK):
+            chunk = [uuid.UUID(int=key) for key in ranked[start:start + FILTER_CHUNK]]
+            kept = set(flowers.filter(flower_id__in=chunk).values_list('flower_id', flat=True))
+            page += [flower_id for flower_id in chunk if flower_id in kept]
+            if len(page) >= limit:
+                break
+        page = page[:limit]
+    by_id = {flower.flower_id: flower for flower in flowers.filter(flower_id__in=page).order_by()}
+    # Another worker may have just deleted a flower this index still has.
+    return [by_id[flower_id] for flower_id in page if flower_id in by_id]
+
+
+def _postgres_search(flowers, query, limit):
+    from django.contrib.postgres.search import (SearchQuery, SearchRank, SearchVectorField,
+                                                TrigramSimilarity)
+
+    search_query = SearchQuery(query, search_type='websearch', config='english')
+    document = RawSQL(DOCUMENT_SQL, [], output_field=SearchVectorField())
+    results = list(flowers
+                   .alias(document=document)
+                   .filter(Q(document=search_query) | Q(shop__shop_name__trigram_similar=query))
+                   .annotate(rank=SearchRank(F('document'), search_query))
+                   .order_by('-rank', '-created')[:limit])
+    if results:
+        return results
+    # Nothing matched as words; fall back to fuzzy matching for typos.
+    return list(flowers
+                .filter(Q(flowername__trigram_similar=query) | Q(shop__shop_name__trigram_similar=query))
+                .annotate(similarity=TrigramSimilarity('flowername', query))
+                .order_by('-similarity')[:limit])
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from adaptlearn.cache import bump_namespace
+
+from .cart import emptying_cart, invalidate_summary
+from .models import CATALOG_CACHE, CartItem, Comment, Flower, FlowerShop, new_card_version
+from .search import index
+
+
+@receiver(pre_save, sender=Flower)
+def stamp_flower_card(sender, instance, **kwargs):
+    instance.card_version = new_card_version()
+
+
+@receiver(post_save, sender=Flower)
+@receiver(post_delete, sender=Flower)
+@receiver(post_save, sender=FlowerShop)
+def invalidate_catalog(sender, **kwargs):
+    bump_namespace(CATALOG_CACHE)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_flower_card(sender, instance, **kwargs):
+    Flower.objects.filter(pk=instance.flower_id).bump_card_version()
+
+
+@receiver(post_save, sender=Flower)
+def index_flower(sender, instance, **kwargs):
+    shop_name = instance.shop.shop_name if instance.shop_id else ""
+    index.update(instance.flower_id, instance.created, instance.flowername, instance.desc, shop_name)
+    index.publish()
+
+
+@receiver(post_delete, sender=Flower)
+def unindex_flower(sender, instance, **kwargs):
+    index.remove(instance.flower_id)
+    index.publish()
+
+
+@receiver(post_save, sender=FlowerShop)
+def reindex_shop_flowers(sender, instance, created, **kwargs):
+    if created:
+        return
+    for flower_id, created, name, desc in instance.flowers.values_list('flower_id', 'created', 'flowername', 'desc'):
+        index.update(flower_id, created, name, desc, instance.shop_name)
+    index.publish()
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart_summary(sender, instance, **kwargs):
+    if not emptying_cart():
+        invalidate_summary(instance.cart.user_id)
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import send_mail
+
+from jobs.queue import job
+from .models import Flower, Order
+from . import images, payments
+
+
+@job()
+def process_payment_event(pk):
+  payments.process_event(pk)
+
+
+@job()
+def notify_order_status(order_id):
+  order = Order.objects.select_related('user').get(order_id = order_id)
+  if not order.user.email:
+    return
+  send_mail(
+    subject = f"PetalCart order #{str(order.order_id)[:8]} is {order.status}",
+    message = f"Hi {order.user.username},\n\nYour order #{str(order.order_id)[:8]} is now {order.status}.\n\n🌸 PetalCart",
+    from_email = settings.DEFAULT_FROM_EMAIL,
+    recipient_list = [order.user.email],
+  )
+
+
+@job()
+def build_image_variants(flower_id, img, stale = None):
+  images.delete_variants(stale or {}, default_storage)
+  flower = Flower.objects.filter(flower_id = flower_id).first()
+  if flower is None or flower.img.name != img:
+    # Deleted, or the image was replaced again and a newer job will build it.
+    return
+  images.build_variants(flower)
@@ -0,0 +1,13 @@
+from django import template
+from django.utils.html import format_html_join
+
+from adaptlearn.assets import stylesheet_urls
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheet(name):
+  """<link> tags for STATIC_BUNDLES[name]: the hashed bundle once built, else its sources."""
+  return format_html_join("\n", '<link rel="stylesheet" href="{}">',
+                          ((url,) for url in stylesheet_urls(name)))
@@ -0,0 +1,31 @@
+from django import template
+
+register = template.Library()
+
+# Most efficient first: the browser takes the first <source> it supports.
+SOURCE_ORDER = ("avif", "webp")
+
+
+@register.inclusion_tag("petalcart/picture.html")
+def flower_picture(flower, sizes="100vw", alt=None, css_class=""):
+  """<picture> for flower.img with srcset candidates from flower.img_variants.
+
+  `sizes` should match the rendered width so the browser can pick the
+  smallest variant that still looks sharp, e.g. "45px" for a table thumbnail.
+  """
+  variants = flower.img_variants or {}
+  storage = flower.img.storage
+  sources = [
+    {
+      "type" : f"image/{fmt}",
+      "srcset" : ", ".join(f"{storage.url(name)} {width}w" for width, name in variants[fmt]),
+    }
+    for fmt in SOURCE_ORDER if variants.get(fmt)
+  ]
+  return {
+    "src" : flower.img.url,
+    "alt" : flower.flowername if alt is None else alt,
+    "sizes" : sizes,
+    "sources" : sources,
+    "css_class" : css_class,
+  }
@@ -1,3 +1,856 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from adaptlearn import cache as tiered
+from adaptlearn.assets import minify_css
+from adaptlearn.ids import uuid7
+from adaptlearn.routers import PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter, replica_reads
+from jobs.models import Job
+from jobs.queue import run_pending
+from shop import reservations
+from shop.models import Stock
+from shop.tasks import roll_up_order
+from .models import Cart, CartItem, Comment, Flower, FlowerShop, Order, OrderItem, PaymentEvent
+from . import payments, search
+from .cart import empty_cart, get_summary, summary_key
+from .management.commands.fake_razorpay import make_server as make_fake_gateway
+from .orders import place_order
+
+
+def make_flower(shop=None, name="Rose", price="10.00"):
+    return Flower.objects.create(
+        shop=shop,
+        flowername=name,
+        img="pics/rose.jpg",
+        desc="A flower",
+        price=Decimal(price),
+    )
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="pw")
+        self.client.force_login(self.user)
+        self.flower = make_flower()
+
+    def post_comment(self, rating):
+        return self.client.post(reverse("create_comment", args=[self.flower.flower_id]),
+                                {"body": "nice", "rating": rating})
+
+    def test_comment_views_keep_aggregates_in_step(self):
+        self.post_comment(4)
+        self.post_comment(2)
+        self.flower.refresh_from_db()
+        self.assertEqual((self.flower.rating_count, self.flower.rating_sum), (2, 6))
+        self.assertEqual(self.flower.avg_rating, 3)
+
+        comment = Comment.objects.get(rating=2)
+        self.client.post(reverse("update_comment", args=[comment.comment_id]),
+                         {"body": "better", "rating": 5})
+        self.flower.refresh_from_db()
+        self.assertEqual(self.flower.avg_rating, 4.5)
+
+        self.client.get(reverse("delete_comment", args=[comment.comment_id]))
+        self.client.get(reverse("delete_comment", args=[Comment.objects.get().comment_id]))
+        self.flower.refresh_from_db()
+        self.assertEqual((self.flower.rating_count, self.flower.rating_sum, self.flower.avg_rating), (0, 0, 0))
+
+    def test_rebuild_ratings_command(self):
+        Comment.objects.create(user=self.user, flower=self.flower, body="a", rating=5)
+        Comment.objects.create(user=self.user, flower=self.flower, body="b", rating=2)
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.flower.refresh_from_db()
+        self.assertEqual((self.flower.rating_count, self.flower.rating_sum), (2, 7))
+        self.assertEqual(self.flower.rating_stars, 4)
+
+
+class QueryBudgetTests(TestCase):
+    """Pins the number of queries each list page costs.
+
+    Every page is measured at two data sizes; both must match the budget, so
+    a per-row query (N+1) fails even when the budget itself is bumped. Pages
+    are measured warm: cached fragments such as the cart badge are primed by
+    a first request. The catalog is cached whole (pages and cards), so the
+    home page is also measured cold (cold=True clears the cache before the
+    measured request); otherwise the catalog queries would never be counted.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.buyer = User.objects.create_user("buyer", password="pw")
+        self.owner = User.objects.create_user("owner", password="pw")
+        self.shop = FlowerShop.objects.create(shop_name="Petals", shop_address="1 Road", owner=self.owner)
+
+    def add_catalog_rows(self, n):
+        for i in range(n):
+            flower = make_flower(self.shop, name=f"Flower {i}")
+            Stock.objects.create(flower=flower, shop=self.shop, quantity=5)
+            Comment.objects.create(user=self.buyer, flower=flower, body="lovely", rating=4)
+            order = Order.objects.create(user=self.buyer, total=flower.price, status="Paid")
+            OrderItem.objects.create(order=order, flower=flower, quantity=1, price=flower.price,
+                                     shop=self.shop, created=order.created)
+            cart, _ = Cart.objects.get_or_create(user=self.buyer)
+            CartItem.objects.create(cart=cart, flower=flower, quantity=1)
+
+    def count_queries(self, url, cold):
+        self.client.get(url)
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertQueryBudget(self, user, url, budget, cold=False):
+        self.client.force_login(user)
+        self.add_catalog_rows(2)
+        small = self.count_queries(url, cold)
+        self.add_catalog_rows(3)
+        large = self.count_queries(url, cold)
+        self.assertEqual((small, large), (budget, budget))
+
+    def test_home(self):
+        self.assertQueryBudget(self.buyer, reverse("home"), 9, cold=True)
+
+    def test_home_from_the_catalog_cache(self):
+        self.assertQueryBudget(self.buyer, reverse("home"), 2)
+
+    def test_shop_home(self):
+        self.assertQueryBudget(self.owner, reverse("shop_home"), 6)
+
+    def test_myorders(self):
+        self.assertQueryBudget(self.owner, reverse("myorders"), 6)
+
+    def test_cart_display(self):
+        self.assertQueryBudget(self.buyer, reverse("cart_display"), 3)
+
+    def test_user_order_history(self):
+        self.assertQueryBudget(self.buyer, reverse("order_history"), 4)
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("buyer", password="pw")
+        self.client.force_login(self.user)
+        shop = FlowerShop.objects.create(shop_name="Petals", shop_address="1 Road")
+        self.rose = make_flower(shop, name="Rose", price="10.00")
+        self.lily = make_flower(shop, name="Lily", price="2.50")
+        for flower in (self.rose, self.lily):
+            Stock.objects.create(flower=flower, shop=shop, quantity=10)
+
+    def add(self, flower, quantity):
+        self.client.post(reverse("process_purchase", args=[flower.pk]),
+                         {"quantity": quantity, "action": "add_to_cart"})
+
+    def test_cart_page_totals_come_from_the_database(self):
+        self.add(self.rose, 2)
+        self.add(self.lily, 3)
+        response = self.client.get(reverse("cart_display"))
+        self.assertEqual(response.context["total_price"], Decimal("27.50"))
+        self.assertEqual([item.subtotal for item in response.context["items"]],
+                         [Decimal("20.00"), Decimal("7.50")])
+        self.assertContains(response, "Cart (5)")
+
+    def test_summary_is_cached_until_the_cart_changes(self):
+        self.add(self.rose, 1)
+        self.assertEqual(get_summary(self.user.id)["count"], 1)
+        with self.assertNumQueries(0):
+            get_summary(self.user.id)
+
+        self.add(self.rose, 2)
+        self.assertIsNone(cache.get(summary_key(self.user.id)))
+        self.assertEqual(get_summary(self.user.id), {"count": 3, "total": Decimal("30.00")})
+
+        CartItem.objects.get().delete()
+        self.assertEqual(get_summary(self.user.id)["count"], 0)
+
+    def test_emptying_a_cart_costs_the_same_for_any_size(self):
+        cart = Cart.objects.create(user=self.user)
+        counts = []
+        for size in (1, 6):
+            for i in range(size):
+                CartItem.objects.create(cart=cart, flower=make_flower(name=f"Extra {i}"), quantity=1)
+            self.assertEqual(get_summary(self.user.id)["count"], size)
+            with CaptureQueriesContext(connection) as ctx:
+                empty_cart(self.user.id)
+            counts.append(len(ctx.captured_queries))
+            self.assertIsNone(cache.get(summary_key(self.user.id)))
+            self.assertEqual(get_summary(self.user.id)["count"], 0)
+        self.assertEqual(counts[0], counts[1])
+
+
+class FlowerCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user("owner", password="pw")
+        self.shop = FlowerShop.objects.create(shop_name="Petals", shop_address="1 Road", owner=self.owner)
+        self.rose = make_flower(self.shop, name="Rose", price="10.00")
+        self.stock = Stock.objects.create(flower=self.rose, shop=self.shop, quantity=5)
+
+    def home(self):
+        return self.client.get(reverse("home")).content.decode()
+
+    def test_cards_are_served_from_cache_until_their_version_changes(self):
+        self.assertIn("₹10.00", self.home())
+        Flower.objects.filter(pk=self.rose.pk).update(price=Decimal("12.00"))
+        self.assertIn("₹10.00", self.home())
+
+        Flower.objects.filter(pk=self.rose.pk).bump_card_version()
+        self.assertIn("₹12.00", self.home())
+
+    def test_stock_and_comment_changes_bump_the_card(self):
+        self.assertIn("In Stock: 5", self.home())
+        self.stock.quantity = 3
+        self.stock.save()
+        self.assertIn("In Stock: 3", self.home())
+
+        order = Order.objects.create(user=self.owner, total=Decimal("20.00"))
+        reservations.reserve(order, [(self.rose, 2)])
+        self.assertIn("In Stock: 1", self.home())
+
+        comment = Comment.objects.create(flower=self.rose, user=self.owner, body="Lovely", rating=4)
+        self.assertIn("Lovely", self.home())
+        comment.body = "Wilted"
+        comment.save()
+        self.assertIn("Wilted", self.home())
+
+    def test_cached_fragments_are_self_contained(self):
+        self.home()
+        self.rose.refresh_from_db()
+        for name, text in (("flower_card", "In Stock: 5"), ("flower_card_title", "₹10.00")):
+            fragment = cache.get(make_template_fragment_key(name, [self.rose.flower_id, self.rose.card_version]))
+            self.assertIn(text, fragment)
+            self.assertEqual(fragment.count("<div"), fragment.count("</div>"))
+
+    def test_per_user_links_are_not_cached(self):
+        Comment.objects.create(flower=self.rose, user=self.owner, body="Lovely", rating=4)
+        self.client.force_login(self.owner)
+        page = self.home()
+        self.assertIn(reverse("update_flower", args=[self.rose.pk]), page)
+        self.assertIn("Delete</a>", page)
+
+        self.client.logout()
+        page = self.home()
+        self.assertNotIn(reverse("update_flower", args=[self.rose.pk]), page)
+        self.assertNotIn("Delete</a>", page)
+        self.assertIn("Lovely", page)
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "adaptlearn.cache.TieredCache", "LOCATION": "tiered-l2",
+                "OPTIONS": {"L1_MAX_ENTRIES": 2, "L1_TIMEOUT": 60, "METRICS_FLUSH_EVERY": 1}},
+    "tiered-l2": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tiered-l2"},
+})
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_l1_serves_repeat_reads_and_is_bounded(self):
+        cache.set("flowers:a", 1)
+        cache.set("flowers:b", 2)
+        caches["tiered-l2"].delete("flowers:a")
+        self.assertEqual(cache.get("flowers:a"), 1)
+
+        cache.set("flowers:c", 3)  # evicts the least recently used entry, "b"
+        caches["tiered-l2"].delete("flowers:b")
+        self.assertIsNone(cache.get("flowers:b"))
+
+        cache.delete("flowers:a")
+        self.assertIsNone(cache.get("flowers:a"))
+
+    def test_get_or_set_computes_once_per_miss(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            threading.Event().wait(0.2)
+            return "page"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_set("catalog:x", compute, 60)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["page"] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_namespace_versions_and_metrics(self):
+        key = tiered.versioned_key("catalog", "page")
+        cache.set(key, "old")
+        tiered.bump_namespace("catalog")
+        self.assertNotEqual(tiered.versioned_key("catalog", "page"), key)
+        self.assertIsNone(cache.get(tiered.versioned_key("catalog", "page")))
+
+        cache.set("cart-summary:1", {"count": 1})
+        cache.get("cart-summary:1")
+        cache.get("cart-summary:2")
+        stats = tiered.metrics()["cart-summary"]
+        self.assertEqual((stats["l1_hit"], stats["l1_miss"], stats["l2_miss"]), (1, 1, 1))
+
+
+class SchemaConstraintTests(TestCase):
+    def test_one_cart_per_user_and_one_line_per_flower(self):
+        user = User.objects.create_user("buyer", password="pw")
+        flower = make_flower()
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, flower=flower)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=cart, flower=flower)
+
+    def test_hot_queries_use_indexes(self):
+        make_flower()
+        out = StringIO()
+        call_command("explain_hot_queries", "--min-rows", "0", "--fail", stdout=out)
+        self.assertNotIn("SEQ SCAN", out.getvalue())
+
+
+class TimeOrderedKeyTests(TestCase):
+    def test_uuid7_keys_are_time_ordered(self):
+        keys = [uuid7() for _ in range(5000)]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertEqual({(key.version, key.variant) for key in keys}, {(7, uuid.RFC_4122)})
+
+        order = Order.objects.create(user=User.objects.create_user("buyer"), total=Decimal("1.00"))
+        self.assertEqual(order.order_id.version, 7)
+        self.assertGreater(uuid7(), order.order_id)
+
+
+class CatalogPaginationTests(TestCase):
+    @mock.patch("petalcart.views.CATALOG_PAGE_SIZE", 2)
+    def test_pages_cover_catalog_once_newest_first(self):
+        flowers = [make_flower(name=f"Flower {i}") for i in range(5)]
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse("catalog_page"), {"cursor": cursor or ""})
+            page = response.json()
+            seen += [item["id"] for item in page["flowers"]]
+            cursor = page["next"]
+            if not cursor:
+                break
+        expected = [str(f.flower_id) for f in sorted(flowers, key=lambda f: (f.created, f.flower_id), reverse=True)]
+        self.assertEqual(seen, expected)
+
+    def test_bad_cursor_restarts_from_first_page(self):
+        make_flower()
+        response = self.client.get(reverse("catalog_page"), {"cursor": "not-a-cursor"})
+        self.assertEqual(len(response.json()["flowers"]), 1)
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buyer = User.objects.create_user("buyer", password="pw")
+        self.client.force_login(self.buyer)
+        flower = make_flower()
+        self.orders = []
+        for i in range(12):
+            order = Order.objects.create(user=self.buyer, total=flower.price, status="Paid")
+            OrderItem.objects.create(order=order, flower=flower, quantity=1, price=flower.price)
+            self.orders.append(order)
+        Order.objects.create(user=User.objects.create_user("other"), total=flower.price)
+
+    def test_cursor_pages_cover_history_once_newest_first(self):
+        seen, cursor, counts = [], None, []
+        while True:
+            params = {"cursor": cursor} if cursor else {}
+            self.client.get(reverse("order_history"), params)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse("order_history"), params)
+            counts.append(len(ctx.captured_queries))
+            seen += [order.order_id for order in response.context["orders"]]
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+        expected = [o.order_id for o in sorted(self.orders, key=lambda o: (o.created, o.order_id), reverse=True)]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(counts)), 1)  # deep pages cost the same as the first
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("order_history")).status_code, 302)
+
+
+@override_settings(REPLICA_DATABASES=["replica1"])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def serve(self, view, method="get", cookies=None):
+        """Run `view` behind the pinning middleware; the response body is the read alias."""
+        request = getattr(self.factory, method)("/")
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinningMiddleware(replica_reads(view))(request)
+
+    def read_alias(self, request):
+        return HttpResponse(self.router.db_for_read(Order))
+
+    def test_only_replica_views_read_from_replicas(self):
+        self.assertEqual(self.router.db_for_read(Order), "default")
+        self.assertEqual(self.serve(self.read_alias).content, b"replica1")
+        self.assertEqual(self.router.db_for_write(Order), "default")
+
+    def test_reads_after_a_write_or_in_a_transaction_use_the_primary(self):
+        def write_then_read(request):
+            make_flower()
+            return self.read_alias(request)
+
+        def read_in_transaction(request):
+            with transaction.atomic():
+                return self.read_alias(request)
+
+        self.assertEqual(self.serve(write_then_read).content, b"default")
+        self.assertEqual(self.serve(read_in_transaction).content, b"default")
+
+    def test_writer_is_pinned_to_the_primary(self):
+        response = self.serve(self.read_alias)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        response = self.serve(self.read_alias, method="post")
+        pin = response.cookies[PIN_COOKIE]
+        self.assertEqual(pin["max-age"], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(self.serve(self.read_alias, cookies={PIN_COOKIE: pin.value}).content, b"default")
+        # A forged pin is ignored.
+        self.assertEqual(self.serve(self.read_alias, cookies={PIN_COOKIE: "1"}).content, b"replica1")
+
+
+@override_settings(REPLICA_DATABASES=["replica"])
+class ReplicaDatabaseTests(TransactionTestCase):
+    # "replica" is the test settings' mirror of the primary's test database,
+    # on its own connection, so it sees only committed rows.
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.buyer = User.objects.create_user("buyer", password="pw")
+        self.client.force_login(self.buyer)
+        self.flower = make_flower()
+
+    def history_queries(self, alias):
+        with CaptureQueriesContext(connections[alias]) as ctx:
+            self.assertEqual(self.client.get(reverse("order_history")).status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_history_reads_the_replica_until_the_buyer_writes(self):
+        self.assertGreater(self.history_queries("replica"), 0)
+        self.client.post(reverse("process_purchase", args=[self.flower.pk]),
+                         {"quantity": 1, "action": "add_to_cart"})
+        self.assertEqual(self.history_queries("replica"), 0)
+        self.assertGreater(self.history_queries("default"), 0)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.shop = FlowerShop.objects.create(shop_name="Sunrise Gardens", shop_address="2 Lane")
+        self.rose = make_flower(self.shop, name="Red Rose", price="50.00")
+        self.rose.desc = "Classic romantic bloom"
+        self.rose.save()
+        self.tulip = make_flower(name="Tulip", price="20.00")
+        Stock.objects.create(flower=self.rose, shop=self.shop, quantity=3)
+
+    def search(self, **params):
+        response = self.client.get(reverse("search"), params)
+        return {flower.flowername for flower in response.context["flowers"]}
+
+    def test_matches_name_description_and_shop_by_prefix(self):
+        self.assertEqual(self.search(q="ros"), {"Red Rose"})
+        self.assertEqual(self.search(q="romantic"), {"Red Rose"})
+        self.assertEqual(self.search(q="sunrise"), {"Red Rose"})
+        self.assertEqual(self.search(q="tulip"), {"Tulip"})
+
+    def test_index_follows_saves_and_deletes(self):
+        self.search(q="tulip")
+        self.tulip.flowername = "Yellow Tulip"
+        self.tulip.save()
+        self.assertEqual(self.search(q="yellow"), {"Yellow Tulip"})
+        self.tulip.delete()
+        self.assertEqual(self.search(q="tulip"), set())
+
+    def test_index_follows_shop_renames(self):
+        self.search(q="sunrise")
+        self.shop.shop_name = "Moonlight Blooms"
+        self.shop.save()
+        self.assertEqual(self.search(q="moon"), {"Red Rose"})
+        self.assertEqual(self.search(q="sunrise"), set())
+        self.assertEqual(search.index._sorted_terms, sorted(search.index._postings))
+
+    def test_writes_by_other_processes_are_picked_up(self):
+        self.search(q="tulip")
+        # Another worker's write: no signals here, then its commit bumps the version.
+        Flower.objects.filter(pk=self.tulip.pk).update(flowername="Yellow Tulip")
+        self.assertEqual(self.search(q="yellow"), set())
+        tiered.bump_namespace(search.SEARCH_CACHE)
+        self.assertEqual(self.search(q="yellow"), {"Yellow Tulip"})
+
+    def test_own_writes_do_not_rebuild_the_index(self):
+        self.search(q="tulip")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tulip.flowername = "Yellow Tulip"
+            self.tulip.save()
+        with mock.patch.object(search.index, "build") as build:
+            self.assertEqual(self.search(q="yellow"), {"Yellow Tulip"})
+        build.assert_not_called()
+
+    def test_filters(self):
+        self.assertEqual(self.search(max_price="30"), {"Tulip"})
+        self.assertEqual(self.search(min_price="30"), {"Red Rose"})
+        self.assertEqual(self.search(in_stock="on"), {"Red Rose"})
+        Flower.objects.filter(pk=self.tulip.pk).update(avg_rating=4.5)
+        self.assertEqual(self.search(min_rating="4"), {"Tulip"})
+
+    def test_results_are_the_newest_matches_in_catalog_order(self):
+        for i in range(12):
+            make_flower(name=f"Tulip {i}", price="10.00" if i % 2 else "40.00")
+        search.index.build()  # drop flowers left by other tests' rolled-back rows
+        tulips = Flower.objects.filter(flowername__startswith="Tulip").order_by("-created", "-flower_id")
+        self.assertEqual(search.search_flowers("tulip", limit=5), list(tulips[:5]))
+        self.assertEqual(search.search_flowers("tulip", min_price=Decimal("30"), limit=5),
+                         list(tulips.filter(price__gte=30)[:5]))
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="pw")
+        self.shop = FlowerShop.objects.create(shop_name="Petals", shop_address="1 Road")
+
+    def lines(self, n):
+        lines = []
+        for i in range(n):
+            flower = make_flower(self.shop, name=f"Flower {i}")
+            Stock.objects.create(flower=flower, shop=self.shop, quantity=10)
+            lines.append((flower, 2))
+        return lines
+
+    def test_round_trips_do_not_grow_with_cart_size(self):
+        counts = []
+        for size in (1, 6):
+            lines = self.lines(size)
+            with CaptureQueriesContext(connection) as ctx:
+                order = place_order(self.user, lines, Decimal("0"))
+            counts.append(len(ctx.captured_queries))
+            self.assertEqual(order.orderitem_set.count(), size)
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(set(Stock.objects.values_list("quantity", flat=True)), {8})
+
+
+class PaymentGatewayTests(TestCase):
+    def setUp(self):
+        self.server = make_fake_gateway(latency_ms=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address[:2]
+        override = self.settings(RAZORPAY_KEY_ID="key", RAZORPAY_KEY_SECRET="secret",
+                                 RAZORPAY_BASE_URL=f"http://{host}:{port}", RAZORPAY_TIMEOUT=(1, 0.5))
+        override.enable()
+        self.addCleanup(override.disable)
+        payments.reset_client()
+        self.addCleanup(payments.reset_client)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_orders_share_one_pooled_client(self):
+        first = payments.create_order(1000, receipt="r1")
+        second = async_to_sync(payments.acreate_order)(2500)
+        self.assertEqual((first["amount"], second["amount"]), (1000, 2500))
+        self.assertNotEqual(first["id"], second["id"])
+        self.assertIs(payments.get_client(), payments.get_client())
+
+    def test_slow_gateway_times_out(self):
+        self.server.RequestHandlerClass.latency = 1
+        # The razorpay client reports the timeout on stdout itself.
+        with self.assertRaises(payments.GatewayError), redirect_stdout(StringIO()) as out:
+            payments.create_order(1000)
+        self.assertIn("Request timed out.", out.getvalue())
+
+
+@override_settings(RAZORPAY_KEY_SECRET="key-secret", RAZORPAY_WEBHOOK_SECRET="hook-secret")
+class PaymentConfirmationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="pw")
+        shop = FlowerShop.objects.create(shop_name="Petals", shop_address="1 Road")
+        self.flower = make_flower(shop)
+        Stock.objects.create(flower=self.flower, shop=shop, quantity=10)
+        self.order = place_order(self.user, [(self.flower, 3)], Decimal("30"))
+        self.order.razorpay_order_id = "order_abc"
+        self.order.save()
+
+    def send_webhook(self, event_id="evt_1"):
+        body = json.dumps({
+            "event": "payment.captured",
+            "payload": {"payment": {"entity": {"id": "pay_1", "order_id": "order_abc"}}},
+        }).encode()
+        signature = hmac.new(b"hook-secret", body, hashlib.sha256).hexdigest()
+        response = self.client.post(reverse("razorpay_webhook"), body, content_type="application/json",
+                                    HTTP_X_RAZORPAY_SIGNATURE=signature,
+                                    HTTP_X_RAZORPAY_EVENT_ID=event_id)
+        run_pending()
+        return response.json()["status"]
+
+    def send_browser_callback(self):
+        signature = hmac.new(b"key-secret", b"order_abc|pay_1", hashlib.sha256).hexdigest()
+        response = self.client.post(reverse("payment_success"), json.dumps({
+            "razorpay_order_id": "order_abc", "razorpay_payment_id": "pay_1", "razorpay_signature": signature,
+        }), content_type="application/json")
+        run_pending()
+        return response.json()["status"]
+
+    def assertCapturedOnce(self):
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.razorpay_payment_id), ("Paid", "pay_1"))
+        self.assertEqual(Stock.objects.get(flower=self.flower).quantity, 7)
+
+    def test_replayed_webhook_is_ignored(self):
+        self.assertEqual(self.send_webhook(), "ok")
+        self.assertEqual(self.send_webhook(), "duplicate")
+        self.assertEqual(PaymentEvent.objects.get().status, PaymentEvent.PROCESSED)
+        self.assertCapturedOnce()
+
+    def test_webhook_and_browser_callback_apply_once(self):
+        self.assertEqual(self.send_browser_callback(), "ok")
+        self.assertEqual(self.send_webhook(), "ok")
+        self.assertEqual(self.send_browser_callback(), "ok")
+        self.assertCapturedOnce()
+
+    def test_late_capture_leaves_a_shipped_order_alone(self):
+        self.assertEqual(self.send_browser_callback(), "ok")
+        Order.objects.filter(pk=self.order.pk).update(status="Shipped")
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, flower=self.flower, quantity=1)
+        rollups = Job.objects.filter(name=roll_up_order.job_name)
+        self.assertEqual(rollups.count(), 1)
+
+        self.assertEqual(self.send_webhook("evt_late"), "ok")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "Shipped")
+        self.assertTrue(CartItem.objects.filter(cart=cart).exists())
+        self.assertEqual(Stock.objects.get(flower=self.flower).quantity, 7)
+        self.assertEqual(rollups.count(), 1)
+
+    def test_callback_reports_an_expired_hold_whose_stock_was_sold(self):
+        reservations.release_expired(now=timezone.now() + timedelta(days=1))
+        Stock.objects.filter(flower=self.flower).update(quantity=2)
+        self.assertEqual(self.send_browser_callback(), "error")
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.razorpay_payment_id), ("Pending", None))
+        self.assertEqual(Stock.objects.get(flower=self.flower).quantity, 2)
+
+    def test_bad_signature_is_rejected(self):
+        response = self.client.post(reverse("razorpay_webhook"), b"{}", content_type="application/json",
+                                    HTTP_X_RAZORPAY_SIGNATURE="forged")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+
+def jpeg_bytes(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 90)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@override_settings(FLOWER_IMAGE_WIDTHS=(160, 320, 640), FLOWER_IMAGE_FORMATS=("webp",))
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.owner = User.objects.create_user("owner", password="pw")
+        self.shop = FlowerShop.objects.create(shop_name="Petals", shop_address="1 Road", owner=self.owner)
+        self.client.force_login(self.owner)
+
+    def upload(self, width, height):
+        self.client.post(reverse("add_flower"), {
+            "flowername": "Rose", "desc": "Red", "price": "10.00",
+            "img": SimpleUploadedFile("rose.jpg", jpeg_bytes(width, height), content_type="image/jpeg"),
+        })
+        run_pending()
+        return Flower.objects.get()
+
+    def test_upload_request_does_not_wait_for_variants(self):
+        self.client.post(reverse("add_flower"), {
+            "flowername": "Rose", "desc": "Red", "price": "10.00",
+            "img": SimpleUploadedFile("rose.jpg", jpeg_bytes(800, 800), content_type="image/jpeg"),
+        })
+        self.assertEqual(Flower.objects.get().img_variants, {})
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, f'src="/media/{Flower.objects.get().img.name}"')
+        self.assertNotContains(response, "srcset")
+
+        run_pending()
+        self.assertEqual(len(Flower.objects.get().img_variants["webp"]), 3)
+        # The cached catalog page is retired along with the card.
+        self.assertContains(self.client.get(reverse("home")), "srcset")
+
+    def test_upload_writes_variants_next_to_the_original(self):
+        flower = self.upload(1000, 500)
+        self.assertEqual([width for width, _name in flower.img_variants["webp"]], [160, 320, 640])
+        for width, name in flower.img_variants["webp"]:
+            self.assertRegex(name, rf"^pics/rose-{width}w\.[0-9a-f]{{12}}\.webp$")
+            with default_storage.open(name) as fh, Image.open(fh) as image:
+                self.assertEqual((image.format, image.size), ("WEBP", (width, width // 2)))
+
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f"/media/{flower.img_variants['webp'][1][1]} 320w")
+
+    def test_small_images_are_not_upscaled(self):
+        flower = self.upload(100, 80)
+        self.assertEqual([width for width, _name in flower.img_variants["webp"]], [100])
+
+    def test_replacing_the_image_removes_old_variants(self):
+        flower = self.upload(400, 400)
+        old = [name for _width, name in flower.img_variants["webp"]]
+        self.client.post(reverse("update_flower", args=[flower.pk]), {
+            "flowername": "Tulip", "desc": "Red", "price": "10.00",
+            "img": SimpleUploadedFile("tulip.jpg", jpeg_bytes(400, 400), content_type="image/jpeg"),
+        })
+        self.assertEqual(Flower.objects.get().img_variants, {})
+        run_pending()
+        flower.refresh_from_db()
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+        self.assertTrue(flower.img_variants["webp"][0][1].startswith("pics/tulip-"))
+
+    def test_backfill_command(self):
+        name = default_storage.save("pics/old.jpg", ContentFile(jpeg_bytes(800, 600)))
+        flower = Flower.objects.create(shop=self.shop, flowername="Old", img=name, desc="x", price=Decimal("1"))
+        make_flower(self.shop, name="Missing")  # its pics/rose.jpg is not in this MEDIA_ROOT
+        out = StringIO()
+        call_command("build_image_variants", "--workers", "1", stdout=out, stderr=StringIO())
+        flower.refresh_from_db()
+        self.assertEqual(len(flower.img_variants["webp"]), 3)
+        self.assertIn("for 1 flowers (1 failed)", out.getvalue())
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.data = jpeg_bytes(64, 64)
+        self.name = default_storage.save("pics/rose.jpg", ContentFile(self.data))
+        self.url = f"/media/{self.name}"
+
+    def test_uploads_get_content_hashed_immutable_names(self):
+        self.assertRegex(self.name, r"^pics/rose\.[0-9a-f]{12}\.jpg$")
+        self.assertNotEqual(default_storage.save("pics/rose.jpg", ContentFile(self.data)), self.name)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_conditional_requests_get_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_single_byte_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.data[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.data)}")
+
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=-5").content, self.data[-5:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.data)}-").status_code, 416)
+
+    def test_only_images_are_served_inline(self):
+        self.assertEqual(self.client.get(self.url)["X-Content-Type-Options"], "nosniff")
+        for name in ("pics/evil.html", "pics/evil.svg"):
+            name = default_storage.save(name, ContentFile(b"<script>alert(1)</script>"))
+            response = self.client.get(f"/media/{name}")
+            self.assertEqual(response["Content-Type"], "application/octet-stream")
+            self.assertEqual(response["Content-Disposition"], "attachment")
+            self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+
+    def test_paths_outside_media_root_are_not_served(self):
+        self.assertEqual(self.client.get("/media/../manage.py").status_code, 404)
+        self.assertEqual(self.client.get("/media/pics/missing.jpg").status_code, 404)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT="/protected-media/")
+    def test_hands_off_to_the_proxy(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual(response.content, b"")
+
+
+class StaticBuildTests(TestCase):
+    def setUp(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        static = override_settings(STATIC_ROOT=static_root)
+        static.enable()
+        self.addCleanup(static.disable)
+
+    def test_minify_keeps_strings_and_selectors(self):
+        css = """/* header */
+a :hover ,  b > i {
+  color: red;
+  background: url("data:image/svg+xml;a  b, c");
+}
+"""
+        self.assertEqual(minify_css(css), 'a :hover,b > i{color:red;background:url("data:image/svg+xml;a  b, c")}')
+
+    def test_pages_link_sources_until_collectstatic_runs(self):
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, 'href="/static/css/common.css"')
+        self.assertContains(response, 'href="/static/css/home.css"')
+
+    def test_collectstatic_builds_hashed_compressed_bundles(self):
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+        bundle = staticfiles_storage.stored_name("css/payment.bundle.css")
+        self.assertRegex(bundle, r"^css/payment\.bundle\.[0-9a-f]{12}\.css$")
+        self.assertRegex(staticfiles_storage.stored_name("js/payment.js"), r"^js/payment\.[0-9a-f]{12}\.js$")
+        self.assertTrue(staticfiles_storage.exists(bundle + ".gz"))
+        self.assertTrue(staticfiles_storage.exists(bundle + ".br"))
+        with staticfiles_storage.open(bundle) as fh:
+            content = fh.read().decode()
+        self.assertEqual(len(content.splitlines()), 3)  # common, forms, payment
+        self.assertNotIn("/*", content)
+
+        user = User.objects.create_user(username="buyer", password="pw")
+        self.client.force_login(user)
+        response = self.client.get(reverse("cart_display"))
+        cart_bundle = staticfiles_storage.stored_name("css/cart.bundle.css")
+        self.assertContains(response, f'href="/static/{cart_bundle}"')
+        self.assertNotContains(response, "css/cart.css")
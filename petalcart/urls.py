@@ -1,9 +1,9 @@
 from django.urls import path,include
-from django.conf import settings
-from django.conf.urls.static import static
 from . import views
 urlpatterns = [
   path('',views.home,name = 'home'),
+  path('api/flowers/',views.catalog_page,name = 'catalog_page'),
+  path('search/',views.search,name = 'search'),
   path('shop/<uuid:pk>/',views.shop,name = 'shop'),
   path('view_comments/<uuid:pk>',views.view_comment,name = 'view_comment'),
   path('create_comment/<uuid:pk>',views.create_comment,name = "create_comment"),
@@ -16,7 +16,5 @@ urlpatterns = [
   path('update_cart/<int:pk>/',views.update_cart,name = "update_cart"),
   path('delete_cart/<int:pk>/',views.delete_cart,name = "delete_cart"),
   path('payment-success/',views.payment_sucess,name = "payment_success"),
+  path('webhooks/razorpay/',views.razorpay_webhook,name = "razorpay_webhook"),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
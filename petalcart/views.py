@@ -1,41 +1,77 @@
 from django.shortcuts import render,get_object_or_404,redirect
 from .models import Flower,Comment,FlowerShop,Order,OrderItem,Cart,CartItem
-from .forms import CommentForm
-from django.db.models import Avg
+from .forms import CommentForm, SearchForm
+from .pagination import keyset_page
+from .search import search_flowers
+from .orders import place_order
+from .cart import cart_items, store_summary
+from . import catalog, payments, tasks
+from jobs.queue import enqueue
 from shop.models import Stock
+from shop import reservations
 from django.contrib import messages
 from django.db import transaction
+from django.db.models import Prefetch
 from django.contrib.auth.decorators import login_required 
-import razorpay,json
+import json
 from django.conf import settings
 from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from decimal import Decimal, ROUND_HALF_UP
-import hmac
-import hashlib
+from adaptlearn.routers import replica_reads
 # Create your views here.
 
 
+CATALOG_PAGE_SIZE = 24
+
+@replica_reads
 def home(request):
-  flowers = Flower.objects.all()
-  shop = FlowerShop.objects.all()
-  comments = Comment.objects.all()
-  for flower in flowers:
-        avg_rating = flower.comments.aggregate(avg=Avg('rating'))['avg'] or 0
-        flower.avg_rating = round(avg_rating)
-  return render(request,"petalcart/home.html",{"flowers" : flowers, "shops" :shop, "Name" : "Tanuj","comments" : comments , "stock" : Stock })
+  flowers, next_cursor = catalog.get_page(page_size = CATALOG_PAGE_SIZE)
+  return render(request,"petalcart/home.html",{"flowers" : flowers, "next_cursor" : next_cursor, "Name" : "Tanuj"})
+
+@replica_reads
+def catalog_page(request):
+  flowers, next_cursor = catalog.get_page(request.GET.get('cursor'), page_size = CATALOG_PAGE_SIZE)
+  html = render_to_string("petalcart/flower_page.html", {"flowers" : flowers}, request = request)
+  return JsonResponse({
+     "flowers" : [
+        {"id" : str(flower.flower_id), "name" : flower.flowername, "price" : str(flower.price),
+         "url" : reverse('shop', args = [flower.flower_id])}
+        for flower in flowers
+     ],
+     "html" : html,
+     "next" : next_cursor,
+  })
 
+@replica_reads
+def search(request):
+  form = SearchForm(request.GET)
+  flowers = []
+  if form.is_valid():
+    flowers = search_flowers(
+      form.cleaned_data['q'].strip(),
+      min_price = form.cleaned_data['min_price'],
+      max_price = form.cleaned_data['max_price'],
+      in_stock = form.cleaned_data['in_stock'],
+      min_rating = form.cleaned_data['min_rating'],
+    )
+  return render(request,"petalcart/search.html",{"form" : form, "flowers" : flowers})
+
+@replica_reads
 def shop(request,pk):
-  flower = get_object_or_404(Flower, flower_id=pk)
-  avg_rating = flower.comments.aggregate(Avg('rating'))['rating__avg'] or 0
+  flower = catalog.get_flower(pk)
   return render(request, "petalcart/shop.html", {
         "flower": flower,
-        "rating": avg_rating  
+        "rating": flower.avg_rating
     })
   
 
+@replica_reads
 def view_comment(request,pk):
   flower = get_object_or_404(Flower,flower_id = pk)
+  flower.latest_comments = flower.comments.select_related('user').order_by('-created')[:1]
   return render(request,"shop/view_comment.html",{"flower" : flower})
 
 ''' def createflower(request):
@@ -64,7 +100,9 @@ def create_comment(request,pk):
       comment.rating = int(rating) if rating else 0
       comment.user = request.user
       comment.flower = flower
-      comment.save()
+      with transaction.atomic():
+        comment.save()
+        flower.adjust_rating(1, comment.rating)
       return redirect('home')
   return render(request,"form.html",{"form" : form})
 
@@ -72,9 +110,13 @@ def create_comment(request,pk):
 def update_comment(request,pk):
   comment = get_object_or_404(Comment,comment_id = pk)
   if request.method == "POST":
+    old_rating = comment.rating
     form =  CommentForm(request.POST,instance = comment)
     if form.is_valid():
-      form.save()
+      with transaction.atomic():
+        comment = form.save()
+        if comment.rating != old_rating:
+          comment.flower.adjust_rating(0, comment.rating - old_rating)
       return redirect('home')
   else:
     form = CommentForm(instance = comment)
@@ -84,7 +126,9 @@ def update_comment(request,pk):
 def delete_comment(request, pk):
     comment = get_object_or_404(Comment, comment_id=pk)
     if request.user == comment.user:
-        comment.delete()
+        with transaction.atomic():
+            comment.delete()
+            comment.flower.adjust_rating(-1, -comment.rating)
         return redirect('home') 
     else:
         # Handle unauthorized access, e.g., redirect or show error
@@ -121,23 +165,15 @@ def process_purchase(request,pk):
 @login_required(login_url='login_account')
 def handle_buy_now(request,flower_id,quantity):
    flower = get_object_or_404(Flower,flower_id = flower_id)
-   with transaction.atomic():
-      order = Order.objects.create(
-         user = request.user,
-         total = flower.price * quantity,
-         status = "Pending"
-      )
-      OrderItem.objects.create(
-         order = order,
-         flower = flower,
-         quantity = quantity,
-         price = flower.price
-      )
-      flower.stock.quantity -= quantity
-      flower.stock.save()
-
-      messages.success(request,"Order placed successfully! ")
+   try:
+      # Buy now has no payment step, so the stock is taken for good here.
+      place_order(request.user, [(flower, quantity)], flower.price * quantity, hold = False)
+   except reservations.InsufficientStock:
+      messages.error(request,f"Sorry, {flower.flowername} just sold out.")
       return redirect("home")
+
+   messages.success(request,"Order placed successfully! ")
+   return redirect("home")
    
 @login_required(login_url='login_account')
 def handle_add_to_cart(request,flower_id,quantity):
@@ -154,32 +190,31 @@ def handle_add_to_cart(request,flower_id,quantity):
   messages.success(request,f"{flower.flowername} added to cart")
   return redirect("cart_display")
 
+ORDER_HISTORY_PAGE_SIZE = 5
+
+@login_required(login_url='/accounts/login/')
+@replica_reads
 def user_order_history(request):
-   all_orders = Order.objects.filter(user=request.user).order_by('-created')
-   page = int(request.GET.get('page', 1))
-   items_per_page = 5
-   start_idx = (page - 1) * items_per_page
-   end_idx = start_idx + items_per_page
-   
-   orders = all_orders[start_idx:end_idx]
-   total_orders = all_orders.count()
-   total_pages = (total_orders + items_per_page - 1) // items_per_page
-   
+   # Keyset over order_history_idx (user, -created, -order_id): every page is
+   # an index range scan, plus one query for all of the page's items.
+   orders = (Order.objects.filter(user=request.user)
+             .prefetch_related(Prefetch('orderitem_set',
+                                        queryset=OrderItem.objects.select_related('flower'))))
+   cursor = request.GET.get('cursor')
+   page, next_cursor = keyset_page(orders, cursor, page_size=ORDER_HISTORY_PAGE_SIZE,
+                                   keys=("created", "order_id"))
+
    return render(request, "petalcart/order_history.html", {
-       "orders": orders,
-       "page": page,
-       "total_pages": total_pages,
-       "has_next": page < total_pages,
-       "has_prev": page > 1
+       "orders": page,
+       "is_first_page": not cursor,
+       "next_cursor": next_cursor,
    })
 
 @login_required(login_url='/accounts/login/')
 def cart_display(request):
-   cart, created = Cart.objects.get_or_create(user = request.user)
-   items = cart.items.all()
-   for item in items:
-      item.subtotal = item.flower.price * item.quantity
-   total_price = sum(item.subtotal for item in items)
+   # One query: lines, flowers, stock, per-line subtotal and cart total.
+   items = list(cart_items(request.user))
+   total_price = store_summary(request.user.id, items)["total"]
    return render(request,"petalcart/cart_display.html", {"items" : items, "total_price" : total_price})
 
 @login_required(login_url='/accounts/login/')
@@ -190,7 +225,8 @@ def checkout_cart(request):
       messages.error(request, "Razorpay keys are not configured. Please set RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET.")
       return redirect('cart_display')
    cart = get_object_or_404(Cart,user = request.user)
-   cart_items = cart.items.all()
+   # One query for the lines, their flowers and stock.
+   cart_items = list(cart.items.select_related('flower__stock'))
    if not cart_items :
       messages.error(request,"Your cart is empy ...")
       return redirect('cart_display')
@@ -206,30 +242,25 @@ def checkout_cart(request):
    else:
       total = Decimal(str(original_total))
    
-   order = Order.objects.create(
-      user = request.user,
-      total = total,
-      status = "Pending"
-   )
-
-   for item in cart_items:
-         OrderItem.objects.create(
-         order= order,
-         flower = item.flower,
-         quantity = item.quantity,
-         price = item.flower.price
-         )
+   try:
+      # Hold the stock while the customer is on the Razorpay checkout.
+      order = place_order(request.user, [(item.flower, item.quantity) for item in cart_items], total)
+   except reservations.InsufficientStock as exc:
+      flower = next(item.flower for item in cart_items if item.flower.pk == exc.flower_id)
+      messages.error(request,f"Not enough stock left for {flower.flowername}.")
+      return redirect('cart_display')
 
-   client = razorpay.Client(
-      auth = (settings.RAZORPAY_KEY_ID,settings.RAZORPAY_KEY_SECRET)
-   )
    # Convert to paise (multiply by 100) and convert to integer
    amount_in_paise = int(Decimal(str(total)) * 100)
-   payment = client.order.create({
-      "amount" : amount_in_paise,
-      "currency" : "INR",
-      "payment_capture" : 1
-   })
+   try:
+      payment = payments.create_order(amount_in_paise, receipt = str(order.order_id))
+   except payments.GatewayError:
+      with transaction.atomic():
+         order.status = "Cancelled"
+         order.save()
+         reservations.release(order)
+      messages.error(request,"The payment gateway is not responding. Please try again in a moment.")
+      return redirect('cart_display')
    
    # IMPORTANT: Store the Razorpay order ID so we can find it later in payment_sucess
    order.razorpay_order_id = payment['id']
@@ -293,59 +324,51 @@ def payment_sucess(request):
    payment_id = data['razorpay_payment_id']
    signature = data['razorpay_signature']
    
-   # Create the signature that should have been sent by Razorpay
-   message = f"{order_id}|{payment_id}"
-   expected_signature = hmac.new(
-      settings.RAZORPAY_KEY_SECRET.encode(),
-      message.encode(),
-      hashlib.sha256
-   ).hexdigest()
-   
-   # Constant-time compare to avoid timing attacks
-   if not hmac.compare_digest(signature, expected_signature):
+   # Constant-time HMAC check of "order_id|payment_id" against our key secret
+   if not payments.signature_matches(settings.RAZORPAY_KEY_SECRET, f"{order_id}|{payment_id}", signature):
       return JsonResponse({
          "status": "error",
          "message": "Payment verification failed - Invalid signature. Payment rejected for security."
       }, status=400)
 
    try:
-      order = Order.objects.get(razorpay_order_id=order_id)
+      # Committed here, not in a job, so a hold that expired and whose stock
+      # was sold meanwhile is reported to the buyer. Idempotent: a replay, or
+      # the webhook getting there first, is a no-op. The order rollup is queued.
+      payments.capture_order(order_id, payment_id)
    except Order.DoesNotExist:
       return JsonResponse({
          "status": "error", 
          "message": f"Order not found with ID: {order_id}"
       }, status=400)
+   except reservations.InsufficientStock as exc:
+      flower = Flower.objects.get(flower_id = exc.flower_id)
+      return JsonResponse({
+         "status": "error", 
+         "message": f"Insufficient stock for {flower.flowername}"
+      }, status=400)
 
-   order.razorpay_payment_id = payment_id
-   order.status = "Paid"
-   
-   with transaction.atomic():
-      # Update stock for each item in the order
-      for order_item in order.orderitem_set.all():
-         try:
-            stock = order_item.flower.stock
-            if stock.quantity >= order_item.quantity:
-               stock.quantity -= order_item.quantity
-               stock.save()
-            else:
-               return JsonResponse({
-                  "status": "error", 
-                  "message": f"Insufficient stock for {order_item.flower.flowername}"
-               }, status=400)
-         except Stock.DoesNotExist:
-            return JsonResponse({
-               "status": "error", 
-               "message": f"Stock not found for {order_item.flower.flowername}"
-            }, status=400)
-      
-      # Delete cart items if cart exists
-      try:
-         cart = Cart.objects.get(user=order.user)
-         cart.items.all().delete()
-      except Cart.DoesNotExist:
-         pass  # Cart may have been deleted already
-      
-      # Save order status
-      order.save()
+   return JsonResponse({"status": "ok"})
+
+@csrf_exempt
+def razorpay_webhook(request):
+   if request.method != "POST":
+      return JsonResponse({"status": "error", "message": "POST required"}, status=405)
+   signature = request.headers.get("X-Razorpay-Signature", "")
+   if not payments.signature_matches(settings.RAZORPAY_WEBHOOK_SECRET, request.body, signature):
+      return JsonResponse({"status": "error", "message": "Invalid signature"}, status=400)
+   try:
+      body = json.loads(request.body)
+   except json.JSONDecodeError:
+      body = None
+   if not isinstance(body, dict):
+      return JsonResponse({"status": "error", "message": "Invalid JSON data"}, status=400)
 
+   payment = body.get("payload", {}).get("payment", {}).get("entity", {})
+   event_id = request.headers.get("X-Razorpay-Event-Id") or f"{body.get('event')}:{payment.get('id')}"
+   event = payments.record_event(event_id, body)
+   if event is None:
+      return JsonResponse({"status": "duplicate"})
+   # Acknowledge now; Razorpay retries anything that takes too long.
+   enqueue(tasks.process_payment_event, pk=event.pk)
    return JsonResponse({"status": "ok"})
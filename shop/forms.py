@@ -1,11 +1,32 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
+from django.core import signing
+from django.core.files.storage import default_storage
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from petalcart.models import Flower 
+from django.utils import timezone
+from adaptlearn.storage import is_uploaded_image
+from petalcart.models import Flower, Order
 from django.forms import ModelForm
 from .models import Stock
 
 
+UPLOAD_TOKEN_SALT = "shop.forms.img_upload"
+UPLOAD_TOKEN_MAX_AGE = 24 * 60 * 60
+
+
+def upload_token(name):
+    return signing.dumps(name, salt=UPLOAD_TOKEN_SALT)
+
+
+def read_upload_token(token):
+    try:
+        return signing.loads(token, salt=UPLOAD_TOKEN_SALT, max_age=UPLOAD_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
 class ShopRegisterForm(UserCreationForm):
     username = forms.CharField(
         max_length=150,
@@ -100,10 +121,38 @@ class FlowerForm(ModelForm):
         })
     )
 
+    # Set by the browser after a direct-to-storage upload (shop.views.presign_flower_image),
+    # in place of posting the file itself.
+    img_upload = forms.CharField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Flower
         exclude = ["shop"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['img'].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        token = cleaned_data.get('img_upload')
+        if token:
+            name = read_upload_token(token)
+            if name is None or not default_storage.exists(name):
+                raise forms.ValidationError("The uploaded image has expired. Please choose it again.")
+            # The browser sent these bytes straight to storage; check them now.
+            if not is_uploaded_image(name, default_storage):
+                default_storage.delete(name)
+                raise forms.ValidationError("The uploaded file is not a JPEG, PNG, WebP or GIF image.")
+            cleaned_data['img'] = name
+        elif not cleaned_data.get('img'):
+            self.add_error('img', "Please choose an image.")
+        return cleaned_data
+
+    @property
+    def image_replaced(self):
+        return 'img' in self.changed_data or bool(self.cleaned_data.get('img_upload'))
+
 
 class FlowerStockForm(ModelForm):
     quantity = forms.IntegerField(
@@ -147,3 +196,32 @@ class StockForm(ModelForm):
         if shop:
             self.fields['flower'].queryset = Flower.objects.filter(shop=shop)
 
+
+class OrderFilterForm(forms.Form):
+    status = forms.ChoiceField(
+        required=False,
+        choices=[('', 'All statuses')] + Order.STATUS_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    date_from = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
+    def apply(self, items):
+        """Narrow an OrderItem queryset to the chosen status and (inclusive) date range."""
+        data = self.cleaned_data
+        if data.get('status'):
+            items = items.filter(order__status=data['status'])
+        # Whole-day bounds on the indexed timestamp, not created__date, so the
+        # range stays an index scan.
+        if data.get('date_from'):
+            items = items.filter(created__gte=timezone.make_aware(datetime.combine(data['date_from'], time.min)))
+        if data.get('date_to'):
+            end = data['date_to'] + timedelta(days=1)
+            items = items.filter(created__lt=timezone.make_aware(datetime.combine(end, time.min)))
+        return items
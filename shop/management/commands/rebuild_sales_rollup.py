@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from shop.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute ShopDailySales (per shop, flower and day) from every counted order."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Orders read per aggregate query.")
+
+    def handle(self, *args, **options):
+        counted = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {counted} orders."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from shop.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Return stock held by checkouts whose payment window (STOCK_HOLD_TTL) has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired stock holds."))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('petalcart', '0013_order_rolled_up'),
+        ('shop', '0002_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.BigIntegerField(default=0)),
+                ('orders', models.IntegerField(default=0)),
+                ('flower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='petalcart.flower')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='petalcart.flowershop')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shop', 'day'], name='shop_daily_sales_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('shop', 'flower', 'day'), name='shop_daily_sales_key')],
+            },
+        ),
+    ]
@@ -12,4 +12,52 @@ class Stock(models.Model):
   created = models.DateTimeField(auto_now=True)
 
   def __str__(self):
-    return f"In {self.shop}  {self.flower} stock was updated to {self.quantity}"
\ No newline at end of file
+    return f"In {self.shop}  {self.flower} stock was updated to {self.quantity}"
+
+
+class StockReservation(models.Model):
+  HELD = 'Held'
+  COMMITTED = 'Committed'
+  RELEASED = 'Released'
+  STATUS_CHOICES = [
+    (HELD, 'Held'),
+    (COMMITTED, 'Committed'),
+    (RELEASED, 'Released'),
+  ]
+  flower = models.ForeignKey(Flower, on_delete = models.CASCADE, related_name = 'reservations')
+  order = models.ForeignKey('petalcart.Order', on_delete = models.CASCADE, related_name = 'reservations')
+  quantity = models.PositiveIntegerField()
+  status = models.CharField(max_length = 10, choices = STATUS_CHOICES, default = HELD)
+  expires_at = models.DateTimeField(null = True, blank = True)
+  created = models.DateTimeField(auto_now_add = True)
+
+  class Meta:
+    indexes = [
+      # release_expired() scans held rows by expiry.
+      models.Index(fields = ['status', 'expires_at'], name = 'reservation_expiry_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.quantity} x {self.flower} for order {self.order_id} ({self.status})"
+
+
+class ShopDailySales(models.Model):
+  # Rollup of counted OrderItems (see shop.rollups), so sales charts read one
+  # row per flower per day instead of every order item.
+  shop = models.ForeignKey(FlowerShop, on_delete = models.CASCADE, related_name = 'daily_sales')
+  flower = models.ForeignKey(Flower, on_delete = models.CASCADE, related_name = 'daily_sales')
+  day = models.DateField()
+  revenue = models.DecimalField(max_digits = 14, decimal_places = 2, default = 0)
+  units = models.BigIntegerField(default = 0)
+  orders = models.IntegerField(default = 0)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields = ['shop', 'flower', 'day'], name = 'shop_daily_sales_key'),
+    ]
+    indexes = [
+      models.Index(fields = ['shop', 'day'], name = 'shop_daily_sales_day_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.day} {self.flower}: {self.units} sold, {self.revenue}"
@@ -0,0 +1,150 @@
+"""Race-free stock reservations on top of Stock.
+
+Stock is only ever changed with conditional UPDATEs (`quantity >= n`), so
+two buyers can never both take the last unit. Cart checkout *holds* stock
+for STOCK_HOLD_TTL while Razorpay is pending; capture commits the hold and
+release_expired() hands abandoned holds back in bulk.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+from django.utils import timezone
+
+from petalcart.models import Flower
+from .models import Stock, StockReservation
+
+
+class InsufficientStock(Exception):
+  def __init__(self, flower_id):
+    super().__init__(f"Not enough stock for flower {flower_id}")
+    self.flower_id = flower_id
+
+
+class _Short(Exception):
+  pass
+
+
+def _per_flower(totals):
+  return Case(*[When(flower_id = flower_id, then = Value(quantity)) for flower_id, quantity in totals.items()],
+              output_field = PositiveIntegerField())
+
+
+def _take(totals):
+  """Decrement every flower in `totals` ({flower_id: quantity}) in one UPDATE.
+
+  Each row only matches while it still covers its quantity, so a short
+  row count means some line couldn't be covered.
+  """
+  covered = Q()
+  for flower_id, quantity in totals.items():
+    covered |= Q(flower_id = flower_id, quantity__gte = quantity)
+  taken = Stock.objects.filter(covered).update(quantity = F('quantity') - _per_flower(totals))
+  if taken != len(totals):
+    raise _Short
+  # Bulk UPDATEs skip Stock's signals, so retire the cached cards here.
+  Flower.objects.filter(pk__in = totals).bump_card_version()
+
+
+def _give_back(totals):
+  if totals:
+    Stock.objects.filter(flower_id__in = totals).update(quantity = F('quantity') + _per_flower(totals))
+    Flower.objects.filter(pk__in = totals).bump_card_version()
+
+
+def _short_of(totals):
+  # Only called after the failed transaction rolled back, to name the culprit.
+  available = dict(Stock.objects.filter(flower_id__in = totals).values_list('flower_id', 'quantity'))
+  return next((flower_id for flower_id, quantity in totals.items()
+               if available.get(flower_id, 0) < quantity), next(iter(totals)))
+
+
+def _totals(pairs):
+  totals = defaultdict(int)
+  for flower_id, quantity in pairs:
+    totals[flower_id] += quantity
+  return totals
+
+
+def reserve(order, lines, hold = True):
+  """Take stock for `lines` ([(flower, quantity), ...]) on behalf of `order`.
+
+  With hold=True the reservation expires after STOCK_HOLD_TTL unless it is
+  committed; with hold=False it is committed straight away (buy now).
+  Raises InsufficientStock, taking nothing, if any line can't be covered.
+  All lines are taken by a single UPDATE.
+  """
+  expires_at = timezone.now() + timedelta(seconds = settings.STOCK_HOLD_TTL) if hold else None
+  totals = _totals((flower.pk, quantity) for flower, quantity in lines)
+  try:
+    with transaction.atomic():
+      _take(totals)
+      return StockReservation.objects.bulk_create([
+        StockReservation(
+          flower = flower,
+          order = order,
+          quantity = quantity,
+          status = StockReservation.HELD if hold else StockReservation.COMMITTED,
+          expires_at = expires_at,
+        )
+        for flower, quantity in lines
+      ])
+  except _Short:
+    raise InsufficientStock(_short_of(totals)) from None
+
+
+def commit(order):
+  """Make the order's holds permanent. Safe to call more than once.
+
+  A hold that already expired and was released is taken again, which
+  raises InsufficientStock if someone else bought the stock meanwhile.
+  """
+  try:
+    with transaction.atomic():
+      pending = list(order.reservations.select_for_update()
+                     .exclude(status = StockReservation.COMMITTED))
+      retake = _totals((r.flower_id, r.quantity) for r in pending
+                       if r.status == StockReservation.RELEASED)
+      if retake:
+        _take(retake)
+      StockReservation.objects.filter(pk__in = [r.pk for r in pending]).update(
+        status = StockReservation.COMMITTED, expires_at = None)
+  except _Short:
+    raise InsufficientStock(_short_of(retake)) from None
+  return len(pending)
+
+
+def release(order):
+  """Return everything the order still holds or took (e.g. on cancellation)."""
+  with transaction.atomic():
+    active = list(order.reservations.select_for_update()
+                  .exclude(status = StockReservation.RELEASED))
+    _release(active)
+  return len(active)
+
+
+def release_expired(batch_size = 500, now = None):
+  """Release holds whose TTL has passed, one batch per transaction."""
+  now = now or timezone.now()
+  released = 0
+  while True:
+    with transaction.atomic():
+      expired = list(StockReservation.objects
+                     .select_for_update(skip_locked = True)
+                     .filter(status = StockReservation.HELD, expires_at__lte = now)
+                     .order_by('expires_at')[:batch_size])
+      _release(expired)
+    released += len(expired)
+    if len(expired) < batch_size:
+      return released
+
+
+def _release(reservations):
+  if not reservations:
+    return
+  totals = _totals((r.flower_id, r.quantity) for r in reservations)
+  StockReservation.objects.filter(pk__in = [r.pk for r in reservations]).update(
+    status = StockReservation.RELEASED, expires_at = None)
+  _give_back(totals)
@@ -0,0 +1,52 @@
+"""Whether the signed-in user is a shop owner, without a query per render.
+
+The answer is memoized on the request and kept in the session next to a
+version stamp. The stamp lives in the cache and is dropped whenever the
+user's groups change (shop.signals), so a stale session answer is noticed
+and recomputed on the next request that asks.
+"""
+import uuid
+
+from django.core.cache import cache
+
+SHOP_OWNER_GROUP = "ShopOwner"
+SESSION_KEY = "_shopowner_status"
+
+
+def version_key(user_id):
+  return f"role-version:{user_id}"
+
+
+def role_version(user_id):
+  key = version_key(user_id)
+  version = cache.get(key)
+  if version is None:
+    cache.add(key, uuid.uuid4().hex, None)
+    version = cache.get(key)
+  return version
+
+
+def invalidate(*user_ids):
+  cache.delete_many([version_key(user_id) for user_id in user_ids])
+
+
+def lookup(user):
+  return user.groups.filter(name = SHOP_OWNER_GROUP).exists()
+
+
+def is_shopowner(request):
+  if not request.user.is_authenticated:
+    return False
+  if hasattr(request, "_is_shopowner"):
+    return request._is_shopowner
+
+  user_id = request.user.pk
+  version = role_version(user_id)
+  stored = request.session.get(SESSION_KEY)
+  if stored and stored.get("user") == user_id and stored.get("version") == version:
+    value = stored["value"]
+  else:
+    value = lookup(request.user)
+    request.session[SESSION_KEY] = {"user" : user_id, "version" : version, "value" : value}
+  request._is_shopowner = value
+  return value
@@ -0,0 +1,133 @@
+"""Daily sales per (shop, flower, day) in ShopDailySales.
+
+An order counts as a sale once it is paid online or delivered, and stops
+counting if it is cancelled. sync_order() moves a single order in or out of
+the rollup when its status changes; Order.rolled_up is flipped with a
+conditional UPDATE in the same transaction, so an order is applied once
+however many times (or from however many workers) it is synced. rebuild()
+recomputes everything from OrderItem.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from petalcart.models import Order, OrderItem
+from .models import ShopDailySales
+
+
+def line_total():
+  return ExpressionWrapper(F('price') * F('quantity'),
+                           output_field = DecimalField(max_digits = 14, decimal_places = 2))
+
+
+def counted_orders():
+  """Orders that count as sales: delivered, or paid online and not cancelled since."""
+  return Order.objects.filter(Q(status = "Delivered")
+                              | (Q(razorpay_payment_id__gt = "") & ~Q(status = "Cancelled")))
+
+
+def sync_order(order_id):
+  """Bring one order's contribution in line with its status. Returns True if it changed."""
+  with transaction.atomic():
+    counted = counted_orders().filter(pk = order_id).exists()
+    flipped = Order.objects.filter(pk = order_id, rolled_up = not counted).update(rolled_up = counted)
+    if flipped:
+      _apply(order_id, 1 if counted else -1)
+  return bool(flipped)
+
+
+def _apply(order_id, sign):
+  lines = defaultdict(lambda: [Decimal("0"), 0])
+  for item in OrderItem.objects.filter(order_id = order_id, shop__isnull = False):
+    line = lines[(item.shop_id, item.flower_id, timezone.localdate(item.created))]
+    line[0] += item.price * item.quantity
+    line[1] += item.quantity
+  for (shop_id, flower_id, day), (revenue, units) in lines.items():
+    _add(shop_id, flower_id, day, sign * revenue, sign * units, sign)
+
+
+def _add(shop_id, flower_id, day, revenue, units, orders):
+  key = {"shop_id" : shop_id, "flower_id" : flower_id, "day" : day}
+  changes = {"revenue" : F('revenue') + revenue, "units" : F('units') + units,
+             "orders" : F('orders') + orders}
+  if ShopDailySales.objects.filter(**key).update(**changes):
+    return
+  try:
+    with transaction.atomic():
+      ShopDailySales.objects.create(**key, revenue = revenue, units = units, orders = orders)
+  except IntegrityError:
+    # Another worker created the row since our UPDATE.
+    ShopDailySales.objects.filter(**key).update(**changes)
+
+
+def rebuild(batch_size = 1000):
+  """Recompute the rollup from scratch, reading `batch_size` orders per query.
+
+  Runs in one transaction: sync_order() calls for orders touched meanwhile
+  wait on the rolled_up flag and then find it already set. Returns the
+  number of orders counted.
+  """
+  totals = defaultdict(lambda: [Decimal("0"), 0, 0])
+  counted = 0
+  with transaction.atomic():
+    ShopDailySales.objects.all().delete()
+    Order.objects.filter(rolled_up = True).update(rolled_up = False)
+
+    orders = counted_orders().order_by('pk').values_list('pk', flat = True)
+    last = None
+    while True:
+      ids = list((orders.filter(pk__gt = last) if last else orders)[:batch_size])
+      if not ids:
+        break
+      rows = (OrderItem.objects
+              .filter(order_id__in = ids, shop__isnull = False)
+              .values('shop_id', 'flower_id', day = TruncDate('created'))
+              .annotate(revenue = Sum(line_total()), units = Sum('quantity'),
+                        orders = Count('order', distinct = True))
+              .order_by())
+      for row in rows:
+        total = totals[(row['shop_id'], row['flower_id'], row['day'])]
+        total[0] += row['revenue']
+        total[1] += row['units']
+        total[2] += row['orders']
+      Order.objects.filter(pk__in = ids).update(rolled_up = True)
+      counted += len(ids)
+      last = ids[-1]
+
+    ShopDailySales.objects.bulk_create([
+      ShopDailySales(shop_id = shop_id, flower_id = flower_id, day = day,
+                     revenue = revenue, units = units, orders = orders)
+      for (shop_id, flower_id, day), (revenue, units, orders) in totals.items()
+    ], batch_size = batch_size)
+  return counted
+
+
+def daily_series(shop, days = 30, today = None):
+  """Revenue and units for each of the last `days` days (oldest first), zero-filled.
+
+  `height` is the day's revenue as a percentage of the busiest day, for bar charts.
+  """
+  today = today or timezone.localdate()
+  start = today - timedelta(days = days - 1)
+  rows = {
+    row['day'] : row
+    for row in (ShopDailySales.objects
+                .filter(shop = shop, day__gte = start, day__lte = today)
+                .values('day')
+                .annotate(revenue = Sum('revenue'), units = Sum('units'))
+                .order_by('day'))
+  }
+  peak = max((row['revenue'] for row in rows.values()), default = 0) or 1
+  series = []
+  for offset in range(days):
+    day = start + timedelta(days = offset)
+    row = rows.get(day, {})
+    revenue = row.get('revenue') or Decimal("0")
+    series.append({"day" : day, "revenue" : revenue, "units" : row.get('units') or 0,
+                   "height" : int(revenue * 100 / peak)})
+  return series
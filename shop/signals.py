@@ -0,0 +1,31 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from petalcart.models import Flower
+from . import roles
+from .models import Stock
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles(sender, instance, action, reverse, pk_set, **kwargs):
+  if not reverse:
+    # user.groups.add/remove/clear(...)
+    if action in ("post_add", "post_remove", "post_clear"):
+      roles.invalidate(instance.pk)
+  elif action == "pre_clear":
+    # group.user_set.clear(): the members are gone once it has run.
+    roles.invalidate(*instance.user_set.values_list("pk", flat=True))
+  elif action in ("post_add", "post_remove"):
+    roles.invalidate(*pk_set)
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_group_members(sender, instance, **kwargs):
+  roles.invalidate(*instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def bump_stock_flower_card(sender, instance, **kwargs):
+  Flower.objects.filter(pk=instance.flower_id).bump_card_version()
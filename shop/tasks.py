@@ -0,0 +1,7 @@
+from jobs.queue import job
+from . import rollups
+
+
+@job()
+def roll_up_order(order_id):
+  rollups.sync_order(order_id)
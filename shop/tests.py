@@ -1,3 +1,337 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from jobs.queue import run_pending
+from petalcart import payments
+from petalcart.models import Flower, FlowerShop, Order
+from petalcart.orders import place_order
+from . import reservations, roles, rollups
+from .forms import read_upload_token
+from .models import ShopDailySales, Stock, StockReservation
+
+
+def make_stocked_flower(quantity, name="Rose"):
+    shop = FlowerShop.objects.create(shop_name=f"{name} shop", shop_address="1 Road")
+    flower = Flower.objects.create(shop=shop, flowername=name, img="pics/rose.jpg",
+                                   desc="A flower", price=Decimal("10.00"))
+    Stock.objects.create(flower=flower, shop=shop, quantity=quantity)
+    return flower
+
+
+def stock_of(flower):
+    return Stock.objects.get(flower=flower).quantity
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="pw")
+        self.rose = make_stocked_flower(5)
+        self.lily = make_stocked_flower(1, name="Lily")
+
+    def new_order(self):
+        return Order.objects.create(user=self.user, total=Decimal("0"), status="Pending")
+
+    def test_reserve_is_all_or_nothing(self):
+        with self.assertRaises(reservations.InsufficientStock) as ctx:
+            reservations.reserve(self.new_order(), [(self.rose, 2), (self.lily, 2)])
+        self.assertEqual(ctx.exception.flower_id, self.lily.pk)
+        self.assertEqual((stock_of(self.rose), stock_of(self.lily)), (5, 1))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_commit_is_idempotent(self):
+        order = self.new_order()
+        reservations.reserve(order, [(self.rose, 2)])
+        self.assertEqual(stock_of(self.rose), 3)
+        reservations.commit(order)
+        reservations.commit(order)
+        self.assertEqual(stock_of(self.rose), 3)
+        self.assertEqual(order.reservations.get().status, StockReservation.COMMITTED)
+
+    def test_expired_holds_are_released_and_retaken_on_commit(self):
+        order = self.new_order()
+        reservations.reserve(order, [(self.rose, 2)])
+        self.assertEqual(reservations.release_expired(now=timezone.now() + timedelta(days=1)), 1)
+        self.assertEqual(stock_of(self.rose), 5)
+
+        reservations.commit(order)
+        self.assertEqual(stock_of(self.rose), 3)
+
+    def test_commit_fails_if_released_stock_was_sold(self):
+        order = self.new_order()
+        reservations.reserve(order, [(self.lily, 1)])
+        reservations.release_expired(now=timezone.now() + timedelta(days=1))
+        reservations.reserve(self.new_order(), [(self.lily, 1)], hold=False)
+        with self.assertRaises(reservations.InsufficientStock):
+            reservations.commit(order)
+        self.assertEqual(stock_of(self.lily), 0)
+
+    def test_buy_now_takes_stock_once(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse("process_purchase", args=[self.rose.pk]),
+                         {"quantity": 2, "action": "buy_now"})
+        self.assertEqual(stock_of(self.rose), 3)
+        self.assertEqual(StockReservation.objects.get().status, StockReservation.COMMITTED)
+
+
+class ReservationConcurrencyTests(TransactionTestCase):
+    THREADS = 16
+    STOCK = 5
+
+    def test_concurrent_buyers_never_oversell(self):
+        user = User.objects.create_user("buyer", password="pw")
+        flower = make_stocked_flower(self.STOCK)
+        results = []
+        start = threading.Barrier(self.THREADS)
+
+        def buy():
+            try:
+                start.wait()
+                for _attempt in range(200):
+                    try:
+                        with transaction.atomic():
+                            order = Order.objects.create(user=user, total=Decimal("10"), status="Pending")
+                            reservations.reserve(order, [(flower, 1)])
+                        results.append(True)
+                        return
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting.
+                        continue
+                    except reservations.InsufficientStock:
+                        results.append(False)
+                        return
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sold = results.count(True)
+        self.assertEqual(len(results), self.THREADS)
+        self.assertEqual(sold, self.STOCK)
+        self.assertEqual(stock_of(flower), 0)
+        self.assertEqual(StockReservation.objects.filter(flower=flower).count(), sold)
+
+
+class ShopOwnerRoleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name=roles.SHOP_OWNER_GROUP)
+        self.user = User.objects.create_user("owner", password="pw")
+        self.user.groups.add(self.group)
+        FlowerShop.objects.create(shop_name="Petals", shop_address="1 Road", owner=self.user)
+        self.client.force_login(self.user)
+
+    def group_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("home"))
+        lookups = [q for q in ctx.captured_queries if "auth_user_groups" in q["sql"]]
+        return response, len(lookups)
+
+    def test_role_is_looked_up_once_per_session(self):
+        response, lookups = self.group_queries()
+        self.assertTrue(response.context["is_shopowner"])
+        self.assertEqual(lookups, 1)
+
+        response, lookups = self.group_queries()
+        self.assertTrue(response.context["is_shopowner"])
+        self.assertEqual(lookups, 0)
+
+    def test_group_changes_invalidate_the_session_copy(self):
+        self.group_queries()
+        self.user.groups.remove(self.group)
+        response, lookups = self.group_queries()
+        self.assertFalse(response.context["is_shopowner"])
+        self.assertEqual(lookups, 1)
+
+        self.group.user_set.add(self.user)
+        response, _lookups = self.group_queries()
+        self.assertTrue(response.context["is_shopowner"])
+
+
+class MyOrdersTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pw")
+        self.buyer = User.objects.create_user("buyer", password="pw")
+        self.rose = make_stocked_flower(100)
+        self.rose.shop.owner = self.owner
+        self.rose.shop.save()
+        self.other = make_stocked_flower(100, name="Lily")
+        self.client.force_login(self.owner)
+
+    def order(self, flower, quantity, status="Paid", days_ago=0):
+        order = place_order(self.buyer, [(flower, quantity)], flower.price * quantity)
+        created = timezone.now() - timedelta(days=days_ago)
+        Order.objects.filter(pk=order.pk).update(status=status, created=created)
+        order.orderitem_set.update(created=created)
+        return order
+
+    def test_totals_cover_only_this_shop_and_filters(self):
+        self.order(self.rose, 2)
+        self.order(self.rose, 1, status="Pending")
+        self.order(self.rose, 3, days_ago=10)
+        self.order(self.other, 5)
+
+        response = self.client.get(reverse("myorders"))
+        self.assertEqual(response.context["totals"],
+                         {"revenue": Decimal("60.00"), "units": 6, "orders": 3})
+        self.assertEqual({row["order__status"]: row["orders"] for row in response.context["by_status"]},
+                         {"Paid": 2, "Pending": 1})
+
+        since = (timezone.now() - timedelta(days=2)).date().isoformat()
+        response = self.client.get(reverse("myorders"), {"status": "Paid", "date_from": since})
+        self.assertEqual(response.context["totals"]["units"], 2)
+        self.assertEqual(len(response.context["items"]), 1)
+
+    @mock.patch("shop.views.MYORDERS_PAGE_SIZE", 2)
+    def test_pages_keep_filters_and_cover_each_sale_once(self):
+        orders = [self.order(self.rose, 1, days_ago=i) for i in range(5)]
+        self.order(self.rose, 1, status="Cancelled")
+        seen, query = [], "?status=Paid"
+        while query:
+            response = self.client.get(reverse("myorders") + query)
+            seen += [item.order_id for item in response.context["items"]]
+            query = response.context["next_url"]
+        self.assertEqual(seen, [order.pk for order in orders])
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pw")
+        self.buyer = User.objects.create_user("buyer", password="pw")
+        self.rose = make_stocked_flower(100)
+        self.shop = self.rose.shop
+        self.shop.owner = self.owner
+        self.shop.save()
+        self.client.force_login(self.owner)
+
+    def paid_order(self, quantity, ref):
+        order = place_order(self.buyer, [(self.rose, quantity)], self.rose.price * quantity)
+        Order.objects.filter(pk=order.pk).update(razorpay_order_id=ref)
+        payments.capture_order(ref, f"pay_{ref}")
+        run_pending()
+        return order
+
+    def rollup(self):
+        return list(ShopDailySales.objects.values_list("units", "revenue", "orders"))
+
+    def test_paid_and_cancelled_orders_update_the_rollup_once(self):
+        first = self.paid_order(2, "order_a")
+        self.paid_order(3, "order_b")
+        self.assertEqual(self.rollup(), [(5, Decimal("50.00"), 2)])
+
+        self.assertFalse(rollups.sync_order(first.pk))
+        self.client.post(reverse("update_order_status", args=[first.pk]), {"new_status": "Cancelled"})
+        run_pending()
+        self.assertEqual(self.rollup(), [(3, Decimal("30.00"), 1)])
+
+    def test_delivered_buy_now_order_is_counted(self):
+        order = place_order(self.buyer, [(self.rose, 4)], Decimal("40"), hold=False)
+        self.client.post(reverse("update_order_status", args=[order.pk]), {"new_status": "Shipped"})
+        run_pending()
+        self.assertEqual(self.rollup(), [])
+        self.client.post(reverse("update_order_status", args=[order.pk]), {"new_status": "Delivered"})
+        run_pending()
+        self.assertEqual(self.rollup(), [(4, Decimal("40.00"), 1)])
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.paid_order(2, "order_a")
+        self.paid_order(1, "order_b")
+        place_order(self.buyer, [(self.rose, 7)], Decimal("70"))  # unpaid
+        incremental = self.rollup()
+
+        call_command("rebuild_sales_rollup", "--batch-size", "1", stdout=StringIO())
+        self.assertEqual(self.rollup(), incremental)
+        self.assertEqual(Order.objects.filter(rolled_up=True).count(), 2)
+
+    def test_dashboard_chart_reads_the_rollup(self):
+        self.paid_order(2, "order_a")
+        sales = self.client.get(reverse("shop_home")).context["sales"]
+        self.assertEqual(len(sales), 30)
+        self.assertEqual((sales[-1]["units"], sales[-1]["height"]), (2, 100))
+        self.assertEqual(sum(day["units"] for day in sales), 2)
+
+
+@override_settings(STORAGES={
+    "default": {"BACKEND": "adaptlearn.storage.HashedInMemoryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pw")
+        FlowerShop.objects.create(shop_name="Petals", shop_address="1 Road", owner=self.owner)
+        self.client.force_login(self.owner)
+
+    def presign(self, content_type="image/jpeg", **extra):
+        return self.client.post(reverse("presign_flower_image"),
+                                {"content_type": content_type, **extra}).json()
+
+    def send(self, presign, data=None):
+        if data is None:
+            buffer = io.BytesIO()
+            Image.new("RGB", (8, 8), (200, 40, 90)).save(buffer, "JPEG")
+            data = buffer.getvalue()
+        return self.client.post(presign["url"], {
+            **presign["fields"], "file": SimpleUploadedFile("x.jpg", data, content_type="image/jpeg"),
+        })
+
+    def add_flower(self, presign):
+        return self.client.post(reverse("add_flower"), {
+            "flowername": "Rose", "desc": "Red", "price": "10.00", "img_upload": presign["token"],
+        })
+
+    def test_flower_is_created_from_a_direct_upload(self):
+        presign = self.presign()
+        self.assertEqual(self.send(presign).status_code, 204)
+
+        self.add_flower(presign)
+        flower = Flower.objects.get()
+        self.assertRegex(flower.img.name, r"^pics/upload\.[0-9a-f]{12}\.jpg$")
+        with default_storage.open(flower.img.name) as fh:
+            self.assertEqual(Image.open(fh).format, "JPEG")
+
+    def test_name_comes_from_the_content_type_not_the_filename(self):
+        presign = self.presign("image/png", filename="evil.html")
+        self.assertEqual(self.presign(content_type="image/svg+xml"), {"direct": False})
+        self.assertEqual(self.send(presign, data=b"<script>alert(1)</script>").status_code, 204)
+
+        response = self.add_flower(presign)
+        self.assertFalse(Flower.objects.exists())
+        self.assertContains(response, "not a JPEG, PNG, WebP or GIF image")
+        name = read_upload_token(presign["token"])
+        self.assertRegex(name, r"^pics/upload\.[0-9a-f]{12}\.png$")
+        self.assertFalse(default_storage.exists(name))
+
+    def test_uploads_must_match_their_policy(self):
+        presign = self.presign()
+        forged = dict(presign, fields=dict(presign["fields"], policy="forged"))
+        self.assertEqual(self.send(forged).status_code, 403)
+        wrong_type = dict(presign, fields=dict(presign["fields"], **{"Content-Type": "image/png"}))
+        self.assertEqual(self.send(wrong_type).status_code, 400)
+        self.assertEqual(self.presign(content_type="text/html"), {"direct": False})
+
+    def test_token_for_a_missing_upload_is_rejected(self):
+        presign = self.presign()  # never sent
+        response = self.client.post(reverse("add_flower"), {
+            "flowername": "Rose", "desc": "Red", "price": "10.00", "img_upload": presign["token"],
+        })
+        self.assertFalse(Flower.objects.exists())
+        self.assertContains(response, "expired")
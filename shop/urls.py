@@ -1,6 +1,4 @@
 from django.urls import path,include
-from django.conf import settings
-from django.conf.urls.static import static
 from . import views
 urlpatterns = [
   path('',views.shop_home,name = 'shop_home'),
@@ -9,12 +7,10 @@ urlpatterns = [
   path('login/',views.shop_login,name = "shop_login"),
   path('add_flower/',views.createflower,name = "add_flower"),
   path('edit_flower/<uuid:pk>/',views.update_flower,name = "update_flower"),
+  path('flower_image/presign/',views.presign_flower_image,name = "presign_flower_image"),
   path('delete_flower/<uuid:pk>/',views.delete_flower,name = "delete_flower"),  
   path('add_flower_stock/<uuid:pk1>/<uuid:pk2>/',views.add_flower_stock,name = "add_flower_stock"),
   path('add_stock/<uuid:pk>/',views.add_stock,name ="add_stock"),
   path('MyOrders/',views.myorders,name = "myorders"),
   path('update_order_Status/<uuid:pk>/',views.update_order_status,name = "update_order_status"),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,29 +1,44 @@
 from django.shortcuts import render , redirect, get_object_or_404
 from petalcart import models as pcmodel
+from petalcart import images
 from django.contrib import messages
 from django.contrib.auth.models import Group
 from .forms import ShopRegisterForm
 from django.contrib.auth import authenticate,login
 from django.contrib.auth.models import User
-from .forms import FlowerForm, StockForm , FlowerStockForm
+from .forms import FlowerForm, StockForm , FlowerStockForm, OrderFilterForm, upload_token
 from .models import Stock
+from . import reservations, roles, rollups
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from petalcart.pagination import keyset_page
+from jobs.queue import enqueue
+from petalcart.tasks import build_image_variants, notify_order_status
+from .tasks import roll_up_order
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from adaptlearn.storage import UPLOAD_IMAGE_TYPES, unique_name
+from adaptlearn.routers import replica_reads
 
 # Create your views here.
 
 def shop_home(request):
   shop = get_object_or_404(pcmodel.FlowerShop,owner = request.user)
-  flowers = shop.flowers.all()
+  flowers = shop.flowers.for_catalog()
   comments = pcmodel.Comment.objects.filter(flower__shop = shop)
   stocks = Stock.objects.filter(shop = shop)
-  return render(request,"shop/home.html",{"flowers" : flowers,"shop" : shop,"comments" : comments , "stocks" : stocks})
+  sales = rollups.daily_series(shop)
+  return render(request,"shop/home.html",{"flowers" : flowers,"shop" : shop,"comments" : comments , "stocks" : stocks, "sales" : sales})
 
 def shop_register(request):
   if request.method == "POST":
     form = ShopRegisterForm(request.POST)
     if form.is_valid():
       user = form.save()
-      shop_group, _created = Group.objects.get_or_create(name="ShopOwner")
+      shop_group, _created = Group.objects.get_or_create(name=roles.SHOP_OWNER_GROUP)
       user.groups.add(shop_group)
       pcmodel.FlowerShop.objects.create(
         owner = user,
@@ -45,7 +60,7 @@ def shop_login(request):
     password = request.POST['password']
     user  = authenticate(username = username,password = password)
     if user:
-      if user.groups.filter(name = "ShopOwner").exists():
+      if roles.lookup(user):
         login(request,user)
         messages.success(request,"Welcome back !")
         return redirect("shop_home")
@@ -57,7 +72,9 @@ def shop_login(request):
 
 @login_required(login_url= 'accounts/')
 def dashboard(request):
-  return render(request,"shop/dashboard.html")
+  shop = pcmodel.FlowerShop.objects.filter(owner = request.user).first()
+  sales = rollups.daily_series(shop) if shop else None
+  return render(request,"shop/dashboard.html",{"sales" : sales})
 
 def createflower(request):
   form = FlowerForm()
@@ -68,6 +85,8 @@ def createflower(request):
       flower = form.save(commit = False)
       flower.shop = pcmodel.FlowerShop.objects.get(owner = request.user)
       flower.save()
+      # Resizing runs in the job worker; pages show the original until then.
+      enqueue(build_image_variants, flower_id = str(flower.pk), img = flower.img.name)
       return redirect('shop_home')
      
   context = {"form" : form}
@@ -81,6 +100,23 @@ def delete_flower(request,pk):
     return redirect('shop_home')
   return render(request,'shop/delete.html',{"obj" : flower})
 
+@login_required(login_url= 'accounts/')
+@require_POST
+def presign_flower_image(request):
+  """Let the browser upload a flower image straight to media storage.
+
+  Returns the presigned POST for the upload and a token that the flower
+  form submits in img_upload instead of the file.
+  """
+  get_object_or_404(pcmodel.FlowerShop, owner = request.user)
+  content_type = request.POST.get("content_type", "")
+  presign = getattr(default_storage, "presigned_upload", None)
+  if presign is None or content_type not in UPLOAD_IMAGE_TYPES:
+    return JsonResponse({"direct" : False})
+  name = unique_name(content_type)
+  upload = presign(name, content_type, settings.FLOWER_IMAGE_MAX_BYTES)
+  return JsonResponse({"direct" : True, "token" : upload_token(name), **upload})
+
 def update_flower(request,pk):
   flower = get_object_or_404(pcmodel.Flower, flower_id = int(pk))
   
@@ -88,6 +124,9 @@ def update_flower(request,pk):
     form = FlowerForm(request.POST,request.FILES,instance = flower)
     if form.is_valid():
       form.save()
+      if form.image_replaced:
+        enqueue(build_image_variants, flower_id = str(flower.pk), img = flower.img.name,
+                stale = images.detach_variants(flower))
       return redirect('shop_home')
   else:
     form = FlowerForm(instance = flower)
@@ -129,11 +168,43 @@ def add_stock(request,pk):
   
   return render(request,"form.html",{"form" : form})
 
+MYORDERS_PAGE_SIZE = 50
+
 @login_required(login_url= 'accounts/')
+@replica_reads
 def myorders(request):
   shop = get_object_or_404(pcmodel.FlowerShop,owner = request.user)
-  items = pcmodel.OrderItem.objects.filter(flower__shop = shop)
-  return render(request,'shop/myorders.html',{"items" : items})
+  form = OrderFilterForm(request.GET)
+  # shop/created are denormalised onto OrderItem, so this is a range scan
+  # of orderitem_shop_created_idx rather than a join through flower.
+  items = pcmodel.OrderItem.objects.filter(shop = shop)
+  if form.is_valid():
+    items = form.apply(items)
+
+  earnings = ExpressionWrapper(F('price') * F('quantity'),
+                               output_field = DecimalField(max_digits = 12, decimal_places = 2))
+  totals = items.aggregate(revenue = Sum(earnings), units = Sum('quantity'),
+                           orders = Count('order', distinct = True))
+  by_status = (items.values('order__status')
+               .annotate(orders = Count('order', distinct = True))
+               .order_by('order__status'))
+
+  page, next_cursor = keyset_page(
+    items.select_related('order__user', 'flower').annotate(earnings = earnings),
+    request.GET.get('cursor'), page_size = MYORDERS_PAGE_SIZE)
+  next_url = None
+  if next_cursor:
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    next_url = f"?{params.urlencode()}"
+
+  return render(request,'shop/myorders.html',{
+    "items" : page,
+    "form" : form,
+    "totals" : totals,
+    "by_status" : by_status,
+    "next_url" : next_url,
+  })
 
 @login_required(login_url= 'accounts/')
 def update_order_status(request,pk):
@@ -142,8 +213,13 @@ def update_order_status(request,pk):
     new_status = request.POST.get('new_status')
     valid_status = ['Accepted', 'Shipped', 'Delivered', 'Cancelled']
     if new_status in valid_status:
-      order.status = new_status
-      order.save()
+      with transaction.atomic():
+        order.status = new_status
+        order.save()
+        if new_status == 'Cancelled':
+          reservations.release(order)
+        enqueue(notify_order_status, order_id = str(order.order_id))
+        enqueue(roll_up_order, order_id = str(order.order_id))
       messages.success(request, f"Order #{str(order.order_id)[:8]} is now {new_status}.")
 
   return redirect('myorders')
@@ -0,0 +1,40 @@
+// Infinite scroll for the catalog grid: fetch the next keyset page when the
+// sentinel below the grid scrolls into view.
+document.addEventListener('DOMContentLoaded', function() {
+    var sentinel = document.getElementById('catalog_sentinel');
+    var grid = document.getElementById('flower_grid');
+    if (!sentinel || !grid || !('IntersectionObserver' in window)) return;
+
+    var loading = false;
+
+    function loadNextPage() {
+        var next = sentinel.dataset.next;
+        if (loading || !next) return;
+        loading = true;
+
+        fetch(sentinel.dataset.url + '?cursor=' + encodeURIComponent(next), {
+            headers: { 'Accept': 'application/json' }
+        })
+        .then(function(response) { return response.json(); })
+        .then(function(page) {
+            grid.insertAdjacentHTML('beforeend', page.html);
+            if (page.next) {
+                sentinel.dataset.next = page.next;
+            } else {
+                observer.disconnect();
+                sentinel.remove();
+            }
+        })
+        .catch(function(error) {
+            console.error('Could not load more flowers:', error);
+        })
+        .finally(function() {
+            loading = false;
+        });
+    }
+
+    var observer = new IntersectionObserver(function(entries) {
+        if (entries[0].isIntersecting) loadNextPage();
+    }, { rootMargin: '600px' });
+    observer.observe(sentinel);
+});
@@ -0,0 +1,51 @@
+// Direct-to-storage image upload for the flower form: ask the server for a
+// presigned POST, send the file straight to storage, then submit the form
+// with only the signed img_upload token. If anything fails, the file input
+// is left alone and the form uploads the image the ordinary way.
+document.addEventListener('DOMContentLoaded', function() {
+    var form = document.querySelector('form[data-presign-url]');
+    if (!form || !window.fetch || !window.FormData) return;
+    var input = form.querySelector('input[type="file"][name="img"]');
+    var token = form.querySelector('input[name="img_upload"]');
+    if (!input || !token) return;
+
+    var csrf = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+    var submit = form.querySelector('[type="submit"]');
+
+    input.addEventListener('change', function() {
+        var file = input.files[0];
+        token.value = '';
+        if (!file) return;
+        if (submit) submit.disabled = true;
+
+        var ask = new FormData();
+        ask.append('content_type', file.type);
+        fetch(form.dataset.presignUrl, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': csrf },
+            body: ask
+        })
+        .then(function(response) { return response.json(); })
+        .then(function(presign) {
+            if (!presign.direct) return;
+            var body = new FormData();
+            Object.keys(presign.fields).forEach(function(key) {
+                body.append(key, presign.fields[key]);
+            });
+            body.append('file', file);  // must come last for S3
+            return fetch(presign.url, { method: 'POST', body: body }).then(function(response) {
+                if (!response.ok) throw new Error('Storage rejected the upload (' + response.status + ')');
+                token.value = presign.token;
+                // The bytes are already stored; don't send them again.
+                input.required = false;
+                input.disabled = true;
+            });
+        })
+        .catch(function(error) {
+            console.error('Direct upload failed, falling back to a normal upload:', error);
+        })
+        .then(function() {
+            if (submit) submit.disabled = false;
+        });
+    });
+});